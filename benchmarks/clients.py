@@ -0,0 +1,308 @@
+# throughput, latency, allocation & model construction benchmarks for the
+# service clients, run against an in-process httpx MockTransport stub that
+# serves realistically sized, pre-serialized payloads.
+#
+#   python benchmarks/clients.py [--calls N] [--concurrency 1,16,64]
+#                                [--output results.json]
+import argparse
+import asyncio
+import json
+import platform
+import re
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+import httpx
+
+from shared_modules import json as jsonu
+from shared_modules.api.rest.v1.beatmaps import BeatmapsClient
+from shared_modules.api.rest.v1.chats import ChatsClient
+from shared_modules.api.rest.v1.scores import ScoresClient
+from shared_modules.api.rest.v1.users import UsersClient
+from shared_modules.http_client import ServiceHTTPClient
+from shared_modules.models.beatmaps import Beatmap
+from shared_modules.models.beatmapsets import Beatmapset
+from shared_modules.models.chats import Chat
+from shared_modules.models.members import Member
+from shared_modules.models.presences import Presence
+from shared_modules.models.scores import Score
+from shared_modules.models.sessions import Session
+
+# roughly what production list endpoints return
+PRESENCE_COUNT = 1_000
+MEMBER_COUNT = 500
+SCORES_PAGE_SIZE = 100
+BEATMAPSETS_PAGE_SIZE = 50
+
+NOW = datetime(2022, 9, 1, 12, 0, 0).isoformat()
+
+
+def _session(i: int) -> dict[str, Any]:
+    return {"session_id": str(uuid.UUID(int=i)), "account_id": i,
+            "user_agent": "osu!", "expires_at": NOW,
+            "created_at": NOW, "updated_at": NOW}
+
+
+def _presence(i: int) -> dict[str, Any]:
+    return {"session_id": str(uuid.UUID(int=i)), "game_mode": 0,
+            "account_id": i, "username": f"player {i}", "country_code": 38,
+            "privileges": 1, "latitude": 43.65, "longitude": -79.38,
+            "action": 2, "info_text": "Artist - Title [Insane]",
+            "map_md5": "a" * 32, "map_id": 1_000_000 + i, "mods": 72,
+            "osu_version": "20220901", "utc_offset": -4,
+            "display_city": False, "pm_private": False}
+
+
+def _chat(i: int) -> dict[str, Any]:
+    return {"chat_id": i, "name": f"#channel{i}", "topic": "general chat",
+            "read_privileges": 1, "write_privileges": 1, "auto_join": i < 3,
+            "instance": False, "status": "active", "updated_at": NOW,
+            "created_at": NOW, "created_by": 1}
+
+
+def _member(i: int) -> dict[str, Any]:
+    return {"session_id": str(uuid.UUID(int=i)), "account_id": i,
+            "chat_id": 1, "username": f"player {i}", "privileges": 1,
+            "joined_at": NOW}
+
+
+def _score(i: int) -> dict[str, Any]:
+    return {"score_id": i, "beatmap_md5": "a" * 32, "account_id": i,
+            "username": f"player {i}", "mode": "osu", "mods": 72,
+            "score": 10_000_000 - i, "performance": 412.5, "accuracy": 98.76,
+            "max_combo": 1_234, "count_50s": 1, "count_100s": 12,
+            "count_300s": 1_100, "count_gekis": 200, "count_katus": 10,
+            "count_misses": 0, "grade": "S", "passed": True, "perfect": False,
+            "seconds_elapsed": 180, "anticheat_flags": 0,
+            "client_checksum": "b" * 32, "status": "active",
+            "created_at": NOW, "updated_at": NOW}
+
+
+def _beatmap(i: int) -> dict[str, Any]:
+    return {"beatmap_id": i, "md5_hash": "a" * 32, "set_id": i // 5,
+            "convert": False, "mode": "osu", "od": 9.0, "ar": 9.5, "cs": 4.0,
+            "hp": 6.0, "bpm": 180.0, "hit_length": 170, "total_length": 180,
+            "count_circles": 800, "count_sliders": 300, "count_spinners": 2,
+            "difficulty_rating": 6.12, "is_scoreable": True,
+            "pass_count": 12_345, "play_count": 234_567,
+            "version": "Insane", "mapper_id": 2, "ranked_status": 1,
+            "status": "active", "created_at": NOW, "updated_at": NOW}
+
+
+def _beatmapset(i: int) -> dict[str, Any]:
+    covers = {f"{kind}{suffix}": f"https://assets.ppy.sh/beatmaps/{i}/covers/{kind}{suffix}.jpg"
+              for kind in ("cover", "card", "list", "slimcover")
+              for suffix in ("", "@2x")}
+    return {"beatmapset_id": i, "artist": "Artist", "artist_unicode": "Artist",
+            "covers": covers, "creator": "mapper", "favourite_count": 1_234,
+            "nsfw": False, "osu_play_count": 1_000_000,
+            "preview_url": f"//b.ppy.sh/preview/{i}.mp3", "source": "",
+            "title": "Title", "title_unicode": "Title", "mapper_id": 2,
+            "mapper_name": "mapper", "video": False, "download_disabled": False,
+            "availability_information": None, "bpm": 180.0,
+            "can_be_hyped": False, "discussion_locked": False,
+            "current_hype": 0, "required_hype": 5, "is_scoreable": True,
+            "osu_updated_at": NOW, "legacy_thread_url": "",
+            "current_nominations": 2, "required_nominations": 2,
+            "ranked_status": 1, "osu_ranked_at": NOW, "storyboard": False,
+            "osu_submitted_at": NOW, "tags": "tag " * 20, "status": "active",
+            "created_at": NOW, "updated_at": NOW}
+
+
+def _envelope(data: Any) -> bytes:
+    return jsonu.dumps({"status": "success", "data": data})
+
+
+# (method, path pattern) -> pre-serialized response body
+ROUTES: list[tuple[str, re.Pattern[str], bytes]] = [
+    ("GET", re.compile(r"/v1/sessions/[^/]+"), _envelope(_session(1))),
+    ("GET", re.compile(r"/v1/presences/[^/]+"), _envelope(_presence(1))),
+    ("GET", re.compile(r"/v1/presences"),
+     _envelope([_presence(i) for i in range(PRESENCE_COUNT)])),
+    ("GET", re.compile(r"/v1/chats"),
+     _envelope([_chat(i) for i in range(20)])),
+    ("GET", re.compile(r"/v1/chats/\d+/members"),
+     _envelope([_member(i) for i in range(MEMBER_COUNT)])),
+    ("POST", re.compile(r"/v1/chats/\d+/members"), _envelope(_member(1))),
+    ("GET", re.compile(r"/v1/scores"),
+     _envelope([_score(i) for i in range(SCORES_PAGE_SIZE)])),
+    ("POST", re.compile(r"/v1/scores"), _envelope(_score(1))),
+    ("GET", re.compile(r"/v1/beatmaps/\d+"), _envelope(_beatmap(1))),
+    ("GET", re.compile(r"/v1/beatmapsets"),
+     _envelope([_beatmapset(i) for i in range(BEATMAPSETS_PAGE_SIZE)])),
+]
+
+
+def stub_handler(request: httpx.Request) -> httpx.Response:
+    for method, pattern, body in ROUTES:
+        if request.method == method and pattern.fullmatch(request.url.path):
+            return httpx.Response(200, content=body,
+                                  headers={"Content-Type": "application/json"})
+    return httpx.Response(404, content=b'{"status":"error"}')
+
+
+def scenarios(http_client: ServiceHTTPClient,
+              ) -> dict[str, Callable[[], Awaitable[Any]]]:
+    users = UsersClient(http_client)
+    chats = ChatsClient(http_client)
+    scores = ScoresClient(http_client)
+    beatmaps = BeatmapsClient(http_client)
+
+    session_id = uuid.UUID(int=1)
+    score = {k: v for k, v in _score(1).items()
+             if k not in ("score_id", "created_at", "updated_at")}
+
+    return {
+        "users.get_session": lambda: users.get_session(session_id),
+        "users.get_presence": lambda: users.get_presence(session_id),
+        "users.get_all_presences": lambda: users.get_all_presences(),
+        "chats.get_chats": lambda: chats.get_chats(),
+        "chats.get_members": lambda: chats.get_members(1),
+        "chats.join_chat": lambda: chats.join_chat(1, session_id, 1,
+                                                   "player 1", 1),
+        "scores.get_scores": lambda: scores.get_scores(
+            beatmap_md5="a" * 32, page_size=SCORES_PAGE_SIZE),
+        "scores.submit_score": lambda: scores.submit_score(**score),
+        "beatmaps.get_beatmap": lambda: beatmaps.get_beatmap(1),
+        "beatmaps.get_beatmapsets": lambda: beatmaps.get_beatmapsets(
+            page_size=BEATMAPSETS_PAGE_SIZE),
+    }
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    index = min(len(sorted_values) - 1,
+                int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(call: Callable[[], Awaitable[Any]], calls: int,
+                   concurrency: int) -> dict[str, float]:
+    latencies: list[float] = []
+    remaining = calls
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            result = await call()
+            latencies.append(time.perf_counter() - start)
+            assert not isinstance(result, Exception) and result, result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 4),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 4),
+    }
+
+
+async def measure_allocations(call: Callable[[], Awaitable[Any]],
+                              calls: int) -> dict[str, float]:
+    await call()  # warm up caches outside of the measurement
+
+    # the peak of traced memory above the pre-call baseline is what a
+    # single call needs to have allocated at once
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await call()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "peak_kib_per_call": round(statistics.fmean(peaks) / 1024, 2),
+        "max_peak_kib": round(max(peaks) / 1024, 2),
+    }
+
+
+def measure_model_construction(calls: int) -> dict[str, dict[str, float]]:
+    records = {
+        "Session": (Session, _session(1)),
+        "Presence": (Presence, _presence(1)),
+        "Chat": (Chat, _chat(1)),
+        "Member": (Member, _member(1)),
+        "Score": (Score, _score(1)),
+        "Beatmap": (Beatmap, _beatmap(1)),
+        "Beatmapset": (Beatmapset, _beatmapset(1)),
+    }
+
+    results = {}
+    for name, (model, record) in records.items():
+        start = time.perf_counter()
+        for _ in range(calls):
+            model(**record)
+        elapsed = time.perf_counter() - start
+        results[name] = {"us_per_model": round(elapsed / calls * 1e6, 3)}
+
+    return results
+
+
+async def run(calls: int, concurrency_levels: list[int],
+              allocation_calls: int) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "timestamp": datetime.now().isoformat(),
+            "calls": calls,
+            "concurrency_levels": concurrency_levels,
+        },
+        "scenarios": {},
+        "models": measure_model_construction(calls),
+    }
+
+    async with ServiceHTTPClient(
+        transport=httpx.MockTransport(stub_handler),
+    ) as http_client:
+        for name, call in scenarios(http_client).items():
+            scenario: dict[str, Any] = {"concurrency": {}}
+            for concurrency in concurrency_levels:
+                scenario["concurrency"][str(concurrency)] = await run_load(
+                    call, calls, concurrency)
+
+            scenario["allocations"] = await measure_allocations(
+                call, allocation_calls)
+            results["scenarios"][name] = scenario
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", default="1,16,64")
+    parser.add_argument("--allocation-calls", type=int, default=20)
+    parser.add_argument("--output", help="write results to this json file")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+    results = asyncio.run(run(args.calls, concurrency_levels,
+                              args.allocation_calls))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
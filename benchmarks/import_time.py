@@ -0,0 +1,89 @@
+# guards the import cost of the lightweight entrypoints. each module is
+# imported in a fresh interpreter under `-X importtime`; the run fails if
+# a module pulls in a heavy dependency it shouldn't, or exceeds its budget.
+#
+#   python benchmarks/import_time.py [--repeat N] [--json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# module -> (cumulative budget in ms, dependencies it must not import)
+BUDGETS: dict[str, tuple[float, tuple[str, ...]]] = {
+    "shared_modules": (15.0, ("httpx", "pydantic", "structlog")),
+    "shared_modules.json": (20.0, ("httpx", "pydantic", "structlog")),
+    "shared_modules.logger": (120.0, ("httpx", "pydantic")),
+    "shared_modules.models": (200.0, ("httpx", "structlog")),
+    "shared_modules.api.rest.v1": (15.0, ("httpx", "pydantic", "structlog")),
+}
+
+_PROBE = """\
+import sys
+import {module}
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+def measure(module: str) -> tuple[float, set[str]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": root}
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime",
+         "-c", _PROBE.format(module=module)],
+        capture_output=True, text=True, check=True, env=env,
+    )
+
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == module.split(".")[0] or name.strip() == module:
+            if cumulative.strip().isdigit():
+                cumulative_us = max(cumulative_us, int(cumulative))
+
+    return cumulative_us / 1000, set(proc.stdout.split())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for module, (budget_ms, forbidden) in BUDGETS.items():
+        timings = []
+        for _ in range(args.repeat):
+            elapsed_ms, loaded = measure(module)
+            timings.append(elapsed_ms)
+
+        best_ms = min(timings)
+        leaked = sorted(dep for dep in forbidden if dep in loaded)
+        ok = best_ms <= budget_ms and not leaked
+        failed |= not ok
+
+        results[module] = {"import_ms": round(best_ms, 2),
+                           "budget_ms": budget_ms,
+                           "leaked_imports": leaked,
+                           "ok": ok}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, result in results.items():
+            status = "ok" if result["ok"] else "REGRESSED"
+            leaked = (f" (imports {', '.join(result['leaked_imports'])})"
+                      if result["leaked_imports"] else "")
+            print(f"{module:<30} {result['import_ms']:>8.2f} ms "
+                  f"/ {result['budget_ms']:>6.1f} ms  {status}{leaked}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,55 @@
+# lines per second of the production json log renderer, compared to
+# structlog's stdlib-json based JSONRenderer.
+#
+#   python benchmarks/log_renderer.py [--number N]
+import argparse
+import timeit
+import uuid
+from datetime import datetime
+
+import structlog
+
+from shared_modules import logger
+from shared_modules.models.sessions import Session
+
+
+def _event_dict() -> dict:
+    now = datetime.now()
+    return {
+        "event": "Failed to get presence",
+        "timestamp": now.isoformat() + "Z",
+        "level": "error",
+        "logger": "root",
+        "process_id": 1,
+        "request_id": str(uuid.uuid4()),
+        "status": 503,
+        "error": "service_error",
+        "session_id": uuid.uuid4(),
+        "session": Session(session_id=uuid.uuid4(), account_id=1,
+                           user_agent="osu!", expires_at=now,
+                           created_at=now, updated_at=now),
+        "response": {"status": "error", "error": "unavailable",
+                     "message": "the service is currently unavailable",
+                     "data": [{"id": i, "name": f"user {i}"} for i in range(20)]},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=50_000)
+    args = parser.parse_args()
+
+    renderers = {
+        "structlog JSONRenderer": structlog.processors.JSONRenderer(),
+        "shared_modules render_json": logger.render_json,
+    }
+    for name, renderer in renderers.items():
+        elapsed = min(timeit.repeat(lambda: renderer(None, "error", _event_dict()),
+                                    number=args.number, repeat=3))
+        build = min(timeit.repeat(_event_dict, number=args.number, repeat=3))
+        lines_per_second = args.number / (elapsed - build)
+        print(f"{name:<28} {lines_per_second:>12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
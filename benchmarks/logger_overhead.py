@@ -0,0 +1,67 @@
+# per-call overhead of the shared_modules.logger helpers, for enabled
+# and filtered levels, compared to logging through structlog directly
+# (which builds the event before the level is checked).
+#
+#   python benchmarks/logger_overhead.py [--number N]
+import argparse
+import io
+import logging
+import timeit
+from typing import Callable
+
+import structlog
+
+from shared_modules import logger
+
+
+def _structlog_info() -> None:
+    structlog.wrap_logger(logging.getLogger(), logger_name="root").info(
+        "Failed to get presence", status=503)
+
+
+def _structlog_debug() -> None:
+    structlog.wrap_logger(logging.getLogger(), logger_name="root").debug(
+        "Failed to get presence", status=503)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # render synchronously into memory so the numbers include formatting
+    logger.configure_logging("production", "INFO", log_queue_size=None,
+                             rate_limiter=None)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(io.StringIO())
+
+    _run({
+        "info (enabled)": lambda: logger.info("Failed to get presence",
+                                              status=503),
+        "debug (filtered)": lambda: logger.debug("Failed to get presence",
+                                                 status=503),
+        "structlog info (enabled)": _structlog_info,
+        "structlog debug (filtered)": _structlog_debug,
+    }, args.number)
+
+    # the same hot event, almost always dropped by the rate limiter
+    structlog.configure(processors=[
+        structlog.stdlib.filter_by_level,
+        logger.EventRateLimiter(),
+        *structlog.get_config()["processors"][1:],
+    ])
+    _run({
+        "info (rate limited)": lambda: logger.info("Failed to get presence",
+                                                   status=503),
+    }, args.number)
+
+
+def _run(cases: dict[str, Callable[[], None]], number: int) -> None:
+    for name, func in cases.items():
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:<28} {elapsed / number * 1e9:>10.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
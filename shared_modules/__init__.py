@@ -1,2 +1,9 @@
-from . import api
-from . import models
+from typing import TYPE_CHECKING
+
+from ._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from . import api
+    from . import models
+
+__getattr__, __dir__ = lazy_loader(__name__, submodules=("api", "models"))
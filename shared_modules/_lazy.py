@@ -0,0 +1,30 @@
+import importlib
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Mapping
+
+
+def lazy_loader(package: str, submodules: Iterable[str],
+                attributes: Mapping[str, str] | None = None,
+                ) -> tuple[Callable[[str], Any], Callable[[], list[str]]]:
+    # PEP 562 module __getattr__ & __dir__ which import a package's
+    # submodules (and names re-exported from them) on first access
+    submodules = frozenset(submodules)
+    attributes = dict(attributes or {})
+
+    def __getattr__(name: str) -> Any:
+        if name in submodules:
+            return importlib.import_module(f"{package}.{name}")
+
+        if (submodule := attributes.get(name)) is not None:
+            module = importlib.import_module(f"{package}.{submodule}")
+            return getattr(module, name)
+
+        raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+    def __dir__() -> list[str]:
+        module = importlib.import_module(package)
+        return sorted({*vars(module), *submodules, *attributes})
+
+    return __getattr__, __dir__
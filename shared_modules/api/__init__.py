@@ -1 +1,11 @@
-from . import rest
+from typing import TYPE_CHECKING
+
+from shared_modules._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from . import login
+    from . import rest
+    from . import subscriptions
+
+__getattr__, __dir__ = lazy_loader(__name__,
+                                   submodules=("login", "rest", "subscriptions"))
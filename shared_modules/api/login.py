@@ -0,0 +1,238 @@
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Mapping
+
+from shared_modules import logger
+from shared_modules.api.rest.v1.chats import ChatsClient
+from shared_modules.api.rest.v1.users import UsersClient
+from shared_modules.http_client import ServiceError
+from shared_modules.models.accounts import Account
+from shared_modules.models.members import Member
+from shared_modules.models.presences import Action
+from shared_modules.models.presences import Presence
+from shared_modules.models.queued_packets import QueuedPacket
+from shared_modules.models.sessions import LoginData
+from shared_modules.models.sessions import Session
+from shared_modules.models.stats import Stats
+
+# called with the results of the steps it depends on
+StepFunction = Callable[[dict[str, Any]], Awaitable[Any]]
+
+# each step of a login, & the steps whose results it needs; a step runs
+# as soon as those are done, so e.g. stats are fetched alongside the
+# account, and the presence is created alongside the chat joins
+LOGIN_STEPS: Mapping[str, tuple[str, ...]] = {
+    "session": (),
+    "account": ("session",),
+    "stats": ("session",),
+    "packets": ("session",),
+    "presence": ("session", "account"),
+    "chats": ("session", "account"),
+}
+
+# the login fails if any of these do; failures of the rest are reported
+# in the result, and the player gets in without them
+REQUIRED_STEPS = frozenset(("session", "account", "presence"))
+
+
+class StepTiming:
+    __slots__ = ("started", "elapsed")
+
+    def __init__(self, started: float, elapsed: float) -> None:
+        # seconds since the login began, & that the step took
+        self.started = started
+        self.elapsed = elapsed
+
+    def __repr__(self) -> str:
+        return (f"StepTiming(started={self.started * 1000:.3f}ms, "
+                f"elapsed={self.elapsed * 1000:.3f}ms)")
+
+
+class LoginResult:
+    __slots__ = ("session", "account", "stats", "presence", "chats",
+                 "packets", "errors", "timings", "elapsed")
+
+    def __init__(self, results: dict[str, Any],
+                 errors: dict[str, ServiceError],
+                 timings: dict[str, StepTiming], elapsed: float) -> None:
+        self.session: Session = results["session"]
+        self.account: Account = results["account"]
+        self.presence: Presence = results["presence"]
+        # the optional steps are None if they failed (see `errors`)
+        self.stats: list[Stats] | None = results.get("stats")
+        self.chats: dict[int, Member | ServiceError] | None = \
+            results.get("chats")
+        self.packets: list[QueuedPacket] | None = results.get("packets")
+
+        self.errors = errors
+        self.timings = timings
+        self.elapsed = elapsed
+
+
+async def _run_steps(steps: Mapping[str, tuple[tuple[str, ...], StepFunction]],
+                     required: frozenset[str], results: dict[str, Any],
+                     ) -> tuple[dict[str, ServiceError], dict[str, StepTiming]]:
+    # runs each step once its dependencies are done, skipping it if any
+    # of them failed. the first failure of a required step cancels the
+    # rest. steps must be given after the steps they depend on. results
+    # are added to `results` as they come in, so that they're known even
+    # if this raises.
+    start = time.monotonic()
+    errors: dict[str, ServiceError] = {}
+    timings: dict[str, StepTiming] = {}
+
+    tasks: dict[str, asyncio.Task[None]] = {}
+
+    async def run(name: str) -> None:
+        dependencies, function = steps[name]
+        for dependency in dependencies:
+            await tasks[dependency]
+            if dependency not in results:
+                return
+
+        step_start = time.monotonic()
+        result = await function(results)
+        timings[name] = StepTiming(step_start - start,
+                                   time.monotonic() - step_start)
+
+        if isinstance(result, ServiceError):
+            errors[name] = result
+        else:
+            results[name] = result
+
+    for name in steps:
+        tasks[name] = asyncio.create_task(run(name))
+
+    pending = set(tasks.values())
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # raise anything unexpected
+
+            if not required.isdisjoint(errors):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    return errors, timings
+
+
+async def log_in(users: UsersClient, chats: ChatsClient,
+                 login_data: LoginData, *, user_agent: str,
+                 privileges: int, country_code: int,
+                 latitude: float = 0.0, longitude: float = 0.0,
+                 game_mode: int = 0) -> LoginResult | ServiceError:
+    # a bancho login, with its independent service calls made concurrently.
+    # if it fails part way, anything it created is undone.
+    async def create_session(results: dict[str, Any]) -> Session | ServiceError:
+        return await users.log_in(login_data["username"],
+                                  login_data["password_md5"], user_agent)
+
+    async def get_account(results: dict[str, Any]) -> Account | ServiceError:
+        return await users.get_account(results["session"].account_id)
+
+    async def get_stats(results: dict[str, Any]) -> list[Stats] | ServiceError:
+        return await users.get_all_account_stats(results["session"].account_id)
+
+    async def dequeue_packets(results: dict[str, Any],
+                              ) -> list[QueuedPacket] | ServiceError:
+        return await users.deqeue_all_packets(results["session"].session_id)
+
+    async def create_presence(results: dict[str, Any]) -> Presence | ServiceError:
+        session: Session = results["session"]
+        return await users.create_presence(
+            session_id=session.session_id,
+            game_mode=game_mode,
+            account_id=session.account_id,
+            username=results["account"].username,
+            country_code=country_code,
+            privileges=privileges,
+            latitude=latitude,
+            longitude=longitude,
+            action=Action.IDLE,
+            info_text="",
+            map_md5="",
+            map_id=0,
+            mods=0,
+            osu_version=login_data["osu_version"],
+            utc_offset=login_data["utc_offset"],
+            display_city=login_data["display_city"],
+            pm_private=login_data["pm_private"],
+        )
+
+    async def join_chats(results: dict[str, Any],
+                         ) -> dict[int, Member | ServiceError] | ServiceError:
+        session: Session = results["session"]
+        return await chats.join_chats(session.session_id, None,
+                                      session.account_id,
+                                      results["account"].username, privileges)
+
+    functions: dict[str, StepFunction] = {
+        "session": create_session,
+        "account": get_account,
+        "stats": get_stats,
+        "packets": dequeue_packets,
+        "presence": create_presence,
+        "chats": join_chats,
+    }
+
+    start = time.monotonic()
+    results: dict[str, Any] = {}
+    try:
+        errors, timings = await _run_steps(
+            {name: (dependencies, functions[name])
+             for name, dependencies in LOGIN_STEPS.items()},
+            REQUIRED_STEPS,
+            results,
+        )
+    except BaseException:
+        # cancelled (e.g. the client went away), or a step raised
+        if "session" in results:
+            # the caller may not wait for it (e.g. if cancelled again)
+            await asyncio.shield(_undo_login(users, chats, results,
+                                             interrupted=True))
+        raise
+    elapsed = time.monotonic() - start
+
+    failed = [name for name in LOGIN_STEPS
+              if name in REQUIRED_STEPS and name in errors]
+    if not failed:
+        return LoginResult(results, errors, timings, elapsed)
+
+    step = failed[0]
+    if step != "session":
+        logger.warning("Login failed",
+                       step=step,
+                       error=errors[step],
+                       timings_ms={name: round(timing.elapsed * 1000, 3)
+                                   for name, timing in timings.items()})
+        await _undo_login(users, chats, results)
+
+    return errors[step]
+
+
+async def _undo_login(users: UsersClient, chats: ChatsClient,
+                      results: dict[str, Any],
+                      interrupted: bool = False) -> None:
+    # don't leave a half logged in session behind. if the login was
+    # `interrupted`, steps still running were cut off, and any of their
+    # calls may have been made anyway.
+    session: Session = results["session"]
+    undo = [users.log_out(session.session_id)]
+    if "presence" in results or (interrupted and "account" in results):
+        undo.append(users.delete_presence(session.session_id))
+    if "account" in results:
+        # if the chat joins didn't finish, any of them may have happened
+        joined = results.get("chats")
+        undo.append(chats.leave_all_chats(
+            session.session_id, list(joined) if joined is not None else None,
+        ))
+    await asyncio.gather(*undo)
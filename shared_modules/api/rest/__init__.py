@@ -1 +1,9 @@
-from . import v1
+from typing import TYPE_CHECKING
+
+from shared_modules._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from . import endpoints
+    from . import v1
+
+__getattr__, __dir__ = lazy_loader(__name__, submodules=("endpoints", "v1"))
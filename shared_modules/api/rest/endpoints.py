@@ -0,0 +1,256 @@
+import functools
+import inspect
+import re
+from enum import Enum
+from typing import Any
+from typing import Callable
+from typing import TypeVar
+from urllib.parse import urlencode
+
+from shared_modules.cache.base import Cache
+from shared_modules.cache.base import CachePolicies
+from shared_modules.cache.base import CachePolicy
+from shared_modules.cache.base import DEFAULT_CACHE_POLICY
+from shared_modules.http_client import log_service_error
+from shared_modules.http_client import MethodTypes
+from shared_modules.http_client import ServiceError
+from shared_modules.http_client import ServiceHTTPClient
+from shared_modules.models import BaseModel
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# called with (client, result, arguments) after a successful call
+AfterHook = Callable[[Any, Any, dict[str, Any]], None]
+
+_BODY_METHODS = frozenset(("POST", "PUT", "PATCH"))
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+
+
+class Endpoint:
+    __slots__ = ("name", "method", "route", "response_model", "many",
+                 "idempotent", "cacheable", "hedged", "error_event",
+                 "path_params", "body_param", "aliases", "after")
+
+    def __init__(self, name: str, method: MethodTypes, route: str,
+                 response_model: type | None, many: bool,
+                 idempotent: bool, cacheable: bool, hedged: bool,
+                 error_event: str, body_param: str | None, aliases: dict[str, str],
+                 after: AfterHook | None) -> None:
+        self.name = name
+        self.method = method
+        self.route = route
+        self.response_model = response_model
+        self.many = many
+        self.idempotent = idempotent
+        self.cacheable = cacheable
+        self.hedged = hedged
+        self.error_event = error_event
+        self.path_params = frozenset(re.findall(r"\{(\w+)\}", route))
+        self.body_param = body_param
+        self.aliases = aliases
+        self.after = after
+
+    def __repr__(self) -> str:
+        return f"<Endpoint {self.name}: {self.method} {self.route}>"
+
+    def path(self, arguments: dict[str, Any]) -> str:
+        return self.route.format(**{k: arguments[k] for k in self.path_params})
+
+    def cache_key(self, arguments: dict[str, Any]) -> str:
+        # the path, plus any query string; writes to a resource have no
+        # query, so they share its cached read's key
+        path = self.path(arguments)
+        if self.method in _BODY_METHODS:
+            return path
+
+        query = sorted((self.aliases.get(k, k), v.value if isinstance(v, Enum) else v)
+                       for k, v in arguments.items()
+                       if k not in self.path_params and v is not None)
+        if not query:
+            return path
+        return f"{path}?{urlencode(query, doseq=True)}"
+
+    def build_request(self, arguments: dict[str, Any]) -> dict[str, Any]:
+        path = self.path(arguments)
+
+        if self.body_param is not None:
+            payload = arguments[self.body_param]
+        else:
+            payload = {self.aliases.get(k, k): v
+                       for k, v in arguments.items()
+                       if k not in self.path_params}
+
+        request: dict[str, Any] = {"method": self.method, "path": path}
+        if self.method in _BODY_METHODS:
+            request["json"] = payload
+        elif payload:
+            request["params"] = payload
+        return request
+
+    def parse(self, data: Any) -> Any:
+        model = self.response_model
+        if model is None:
+            return True
+        elif self.many:
+            return [model(**rec) for rec in data]
+        elif issubclass(model, BaseModel):
+            return model(**data)
+        else:
+            return model(data)
+
+
+# every endpoint declared by a client, e.g. for metrics labels
+ROUTES: list[Endpoint] = []
+
+
+def _default_error_event(name: str) -> str:
+    return "Failed to " + name.replace("partial_update_", "update_").replace("_", " ")
+
+
+def endpoint(method: MethodTypes, route: str, response_model: type | None, *,
+             many: bool = False,
+             idempotent: bool | None = None,
+             cacheable: bool = False,
+             hedged: bool = False,
+             error_event: str | None = None,
+             body_param: str | None = None,
+             aliases: dict[str, str] | None = None,
+             after: AfterHook | None = None) -> Callable[[F], F]:
+    # generates a client method from its stub's signature. arguments named
+    # in the route fill the url template; the rest become the query string
+    # (GET, DELETE) or the json body (POST, PUT, PATCH). `body_param` sends
+    # one argument as the whole body, and `aliases` renames arguments.
+    # `hedged` endpoints may be sent twice when slow to answer (see
+    # ServiceHTTPClient's hedge_budget), so must be idempotent reads.
+    def decorator(stub: F) -> F:
+        signature = inspect.signature(stub)
+
+        if hedged and (method != "GET" or idempotent is False):
+            raise ValueError(f"{stub.__name__}: only idempotent GETs "
+                             "can be hedged")
+
+        spec = Endpoint(
+            name=stub.__name__,
+            method=method,
+            route=route,
+            response_model=response_model,
+            many=many,
+            idempotent=(idempotent if idempotent is not None
+                        else method in _IDEMPOTENT_METHODS),
+            cacheable=cacheable,
+            hedged=hedged,
+            error_event=error_event or _default_error_event(stub.__name__),
+            body_param=body_param,
+            aliases=aliases or {},
+            after=after,
+        )
+        ROUTES.append(spec)
+
+        @functools.wraps(stub)
+        async def call(self: "ServiceClient", *args: Any, **kwargs: Any) -> Any:
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments["self"]
+
+            return await self.call_endpoint(spec, arguments)
+
+        call.endpoint = spec  # type: ignore[attr-defined]
+        return call  # type: ignore[return-value]
+
+    return decorator
+
+
+class ServiceClient:
+    service_url: str
+
+    # this client's endpoints, by method name
+    _endpoints: dict[str, Endpoint] = {}
+
+    def __init__(self, http_client: ServiceHTTPClient,
+                 cache: Cache | None = None,
+                 cache_policies: CachePolicies | None = None,
+                 ) -> None:
+        self.http_client = http_client
+        self.cache = cache
+
+        # endpoints marked cacheable use the default policy, unless
+        # overridden (or disabled, with None) in `cache_policies`
+        policies: dict[str, CachePolicy | None] = {
+            name: DEFAULT_CACHE_POLICY
+            for name, spec in self._endpoints.items() if spec.cacheable
+        }
+        for name, policy in (cache_policies or {}).items():
+            spec = self._endpoints.get(name)
+            if spec is None or spec.method != "GET":
+                raise ValueError(f"{type(self).__name__}.{name} is not "
+                                 "a cacheable endpoint")
+            policies[name] = policy
+
+        self.cache_policies = {name: policy for name, policy in policies.items()
+                               if policy is not None}
+
+        # resources cached by url, which writes to that url refresh
+        self._cached_routes = {self._endpoints[name].route: policy
+                               for name, policy in self.cache_policies.items()}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._endpoints = {
+            spec.name: spec for attr in vars(cls).values()
+            if (spec := getattr(attr, "endpoint", None)) is not None
+        }
+
+    async def call_endpoint(self, spec: Endpoint,
+                            arguments: dict[str, Any]) -> Any:
+        if self.cache is None:
+            return await self._call_service(spec, arguments)
+
+        key = f"{self.service_url}{spec.cache_key(arguments)}"
+        if (policy := self.cache_policies.get(spec.name)) is not None:
+            return await self.cache.get_or_load(
+                key, lambda: self._call_service(spec, arguments),
+                ttl=policy.ttl,
+                should_cache=lambda result: not isinstance(result,
+                                                           ServiceError),
+                decode=spec.parse,
+            )
+
+        result = await self._call_service(spec, arguments)
+        if isinstance(result, ServiceError):
+            return result
+
+        # an update or delete of a cached resource replaces or drops it
+        if (policy := self._cached_routes.get(spec.route)) is not None:
+            if spec.method == "DELETE":
+                await self.cache.delete(key)
+            elif spec.method in ("PUT", "PATCH"):
+                await self.cache.set(key, result, policy.ttl)
+
+        return result
+
+    async def _call_service(self, spec: Endpoint,
+                            arguments: dict[str, Any]) -> Any:
+        request = spec.build_request(arguments)
+        path = request.pop("path")
+
+        response = await self.http_client.service_call(
+            url=f"{self.service_url}{path}",
+            route=spec.route,
+            hedge=spec.hedged,
+            **request,
+        )
+        if response.error is not None:
+            log_service_error(spec.error_event, response)
+            return response.error
+
+        # bodies of endpoints without a response model aren't read (they
+        # may well be empty)
+        if spec.response_model is None:
+            result = True
+        else:
+            result = spec.parse(response.data)
+        if spec.after is not None:
+            spec.after(self, result, arguments)
+
+        return result
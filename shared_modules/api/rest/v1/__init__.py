@@ -1,4 +1,24 @@
-from . import beatmaps
-from . import chats
-from . import scores
-from . import users
+from typing import TYPE_CHECKING
+
+from shared_modules._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from . import beatmaps
+    from . import chats
+    from . import scores
+    from . import users
+    from .beatmaps import BeatmapsClient
+    from .chats import ChatsClient
+    from .scores import ScoresClient
+    from .users import UsersClient
+
+__getattr__, __dir__ = lazy_loader(
+    __name__,
+    submodules=("beatmaps", "chats", "scores", "users"),
+    attributes={
+        "BeatmapsClient": "beatmaps",
+        "ChatsClient": "chats",
+        "ScoresClient": "scores",
+        "UsersClient": "users",
+    },
+)
@@ -1,30 +1,98 @@
-from shared_modules import logger
+from datetime import timedelta
+from typing import Any
+from typing import Callable
+from typing import Iterable
+
+from shared_modules.api.rest.endpoints import Endpoint
+from shared_modules.api.rest.endpoints import endpoint
+from shared_modules.api.rest.endpoints import ServiceClient
+from shared_modules.beatmap_index import beatmap_ref
+from shared_modules.beatmap_index import BeatmapIndex
+from shared_modules.beatmap_index import BeatmapRef
+from shared_modules.cache.base import Cache
+from shared_modules.cache.base import CachePolicies
+from shared_modules.disk_cache import DiskCache
+from shared_modules.http_client import log_service_error
+from shared_modules.http_client import ServiceError
 from shared_modules.http_client import ServiceHTTPClient
+from shared_modules.models import RankedStatus
 from shared_modules.models.beatmaps import Beatmap
 from shared_modules.models.beatmapsets import Beatmapset
 
 SERVICE_URL = "http://beatmaps-service"
 
+# page size used when streaming beatmaps into the beatmap index
+BEATMAP_INDEX_PAGE_SIZE = 500
 
-class BeatmapsClient:
-    def __init__(self, http_client: ServiceHTTPClient) -> None:
-        self.http_client = http_client
+BEATMAP_INDEX_WARMUP_STATUSES = (RankedStatus.RANKED,
+                                 RankedStatus.APPROVED,
+                                 RankedStatus.LOVED)
 
-    # beatmaps
+# record kinds in the disk cache
+BEATMAP_RECORD = 1
+BEATMAPSET_RECORD = 2
 
-    async def get_beatmap(self, beatmap_id: int) -> Beatmap | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/beatmaps/{beatmap_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get beatmap",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+# endpoint name -> (record kind, key argument)
+_DISK_CACHED_ENDPOINTS = {
+    "get_beatmap": (BEATMAP_RECORD, "beatmap_id"),
+    "get_beatmapset": (BEATMAPSET_RECORD, "set_id"),
+}
+
+
+def _index_beatmap(client: "BeatmapsClient", beatmap: Beatmap,
+                   arguments: dict[str, Any]) -> None:
+    if client.beatmap_index is not None:
+        client.beatmap_index.record_beatmap(beatmap)
+
+
+def _index_beatmaps(client: "BeatmapsClient", beatmaps: list[Beatmap],
+                    arguments: dict[str, Any]) -> None:
+    if client.beatmap_index is not None:
+        for beatmap in beatmaps:
+            client.beatmap_index.record_beatmap(beatmap)
+
+
+class BeatmapsClient(ServiceClient):
+    service_url = SERVICE_URL
+
+    def __init__(self, http_client: ServiceHTTPClient,
+                 beatmap_index: BeatmapIndex | None = None,
+                 disk_cache: DiskCache | None = None,
+                 cache: Cache | None = None,
+                 cache_policies: CachePolicies | None = None,
+                 ) -> None:
+        super().__init__(http_client, cache, cache_policies)
+        self.beatmap_index = beatmap_index
+        self.disk_cache = disk_cache
 
-        return Beatmap(**response.json['data'])
+    async def call_endpoint(self, spec: Endpoint,
+                            arguments: dict[str, Any]) -> Any:
+        cached = _DISK_CACHED_ENDPOINTS.get(spec.name)
+        if self.disk_cache is None or cached is None:
+            return await super().call_endpoint(spec, arguments)
 
+        kind, key_argument = cached
+        key = arguments[key_argument]
+        if (rec := self.disk_cache.get(kind, key)) is not None:
+            result = spec.parse(rec)
+            if spec.after is not None:
+                spec.after(self, result, arguments)
+            return result
+
+        result = await super().call_endpoint(spec, arguments)
+        if not isinstance(result, ServiceError):
+            self.disk_cache.put(kind, key, result.updated_at, result)
+
+        return result
+
+    # beatmaps
+
+    @endpoint("GET", "/v1/beatmaps/{beatmap_id}", Beatmap, cacheable=True,
+              hedged=True, after=_index_beatmap)
+    async def get_beatmap(self, beatmap_id: int) -> Beatmap | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/beatmaps", Beatmap, many=True, after=_index_beatmaps)
     async def get_beatmaps(self, set_id: int | None = None,
                            md5_hash: str | None = None,
                            mode: str | None = None,
@@ -32,42 +100,126 @@ class BeatmapsClient:
                            status: str | None = None,
                            page: int = 1,
                            page_size: int = 20,
-                           ) -> list[Beatmap] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/beatmaps",
-            params={
-                "set_id": set_id,
-                "md5_hash": md5_hash,
-                "mode": mode,
-                "ranked_status": ranked_status,
-                "status": status,
-                "page": page,
-                "page_size": page_size,
-            })
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get beatmaps",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                           ) -> list[Beatmap] | ServiceError:
+        ...
 
-        return [Beatmap(**rec) for rec in response.json['data']]
+    # beatmap index
 
-    # beatmapsets
+    async def resolve_md5(self, md5_hash: str) -> BeatmapRef | None | ServiceError:
+        if self.beatmap_index is not None:
+            if (ref := self.beatmap_index.get(md5_hash)) is not None:
+                return ref
 
-    async def get_beatmapset(self, set_id: int) -> Beatmapset | None:
         response = await self.http_client.service_call(
             method="GET",
-            url=f"{SERVICE_URL}/v1/beatmapsets/{set_id}",
+            url=f"{SERVICE_URL}/v1/beatmaps",
+            route="/v1/beatmaps",
+            params={"md5_hash": md5_hash, "page_size": 1},
+            hedge=True,
         )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get beatmapset",
-                         status=response.status_code,
-                         response=response.json)
+        if response.error is not None:
+            log_service_error("Failed to get beatmaps", response)
+            return response.error
+
+        if not response.data:
             return None
 
-        return Beatmapset(**response.json['data'])
+        ref = beatmap_ref(response.data[0])
+        if self.beatmap_index is not None:
+            self.beatmap_index.record(md5_hash, ref)
+
+        return ref
+
+    async def warm_beatmap_index(
+        self, ranked_statuses: Iterable[RankedStatus] | None = None,
+    ) -> int | ServiceError:
+        # streams every map in `ranked_statuses` (by default, those in
+        # BEATMAP_INDEX_WARMUP_STATUSES) into the index; for startup,
+        # after BeatmapIndex.load() has failed or been skipped
+        assert self.beatmap_index is not None
+        if ranked_statuses is None:
+            ranked_statuses = BEATMAP_INDEX_WARMUP_STATUSES
+
+        count = len(self.beatmap_index)
+        for ranked_status in ranked_statuses:
+            error = await self._stream_beatmaps(self._record_streamed,
+                                                ranked_status=ranked_status)
+            if error is not None:
+                return error
+
+        return len(self.beatmap_index) - count
+
+    async def refresh_beatmap_index(self) -> int | ServiceError:
+        # re-reads only the maps changed since the newest one indexed
+        assert self.beatmap_index is not None
+
+        if self.beatmap_index.updated_at is None:
+            return await self.warm_beatmap_index()
+
+        updated = 0
+
+        def record(rec: dict[str, Any]) -> None:
+            nonlocal updated
+            if self._record_streamed(rec):
+                updated += 1
+
+        # updated_after is exclusive, & other maps may since have been
+        # updated in the same microsecond as the newest one indexed; so
+        # re-read from just before it (what's unchanged isn't counted)
+        since = self.beatmap_index.updated_at - timedelta(microseconds=1)
+        error = await self._stream_beatmaps(record,
+                                            updated_after=since.isoformat())
+        if error is not None:
+            return error
+
+        return updated
+
+    def _record_streamed(self, rec: dict[str, Any]) -> bool:
+        assert self.beatmap_index is not None
+        if not self.beatmap_index.record_streamed(rec):
+            return False
+
+        # a newer updated_at supersedes whatever the disk cache holds
+        if self.disk_cache is not None:
+            self.disk_cache.put(BEATMAP_RECORD, rec["beatmap_id"],
+                                rec["updated_at"], rec)
+        return True
 
+    async def _stream_beatmaps(self, callback: Callable[[dict[str, Any]], object],
+                               **params: Any) -> ServiceError | None:
+        # raw records only; nothing here needs a validated Beatmap
+        page = 1
+        while True:
+            response = await self.http_client.service_call(
+                method="GET",
+                url=f"{SERVICE_URL}/v1/beatmaps",
+                route="/v1/beatmaps",
+                params={
+                    **params,
+                    "page": page,
+                    "page_size": BEATMAP_INDEX_PAGE_SIZE,
+                },
+            )
+            if response.error is not None:
+                log_service_error("Failed to get beatmaps", response)
+                return response.error
+
+            records = response.data
+            for rec in records:
+                callback(rec)
+
+            if len(records) < BEATMAP_INDEX_PAGE_SIZE:
+                return None
+
+            page += 1
+
+    # beatmapsets
+
+    @endpoint("GET", "/v1/beatmapsets/{set_id}", Beatmapset, cacheable=True)
+    async def get_beatmapset(self, set_id: int) -> Beatmapset | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/beatmapsets", Beatmapset, many=True)
     async def get_beatmapsets(self, set_id: int | None = None,
                               artist: str | None = None,
                               creator: str | None = None,
@@ -77,26 +229,5 @@ class BeatmapsClient:
                               status: str | None = None,
                               page: int = 1,
                               page_size: int = 20,
-                              ) -> list[Beatmapset] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/beatmapsets",
-            params={
-                "set_id": set_id,
-                "artist": artist,
-                "creator": creator,
-                "title": title,
-                "nsfw": nsfw,
-                "ranked_status": ranked_status,
-                "status":  status,
-                "page": page,
-                "page_size": page_size,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get beatmapsets",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Beatmapset(**rec) for rec in response.json['data']]
+                              ) -> list[Beatmapset] | ServiceError:
+        ...
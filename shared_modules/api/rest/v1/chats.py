@@ -1,56 +1,79 @@
+import asyncio
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import TypeVar
 from uuid import UUID
 
-from shared_modules import logger
+from shared_modules.api.rest.endpoints import endpoint
+from shared_modules.api.rest.endpoints import ServiceClient
+from shared_modules.cache.base import Cache
+from shared_modules.cache.base import CachePolicies
+from shared_modules.http_client import is_route_missing
+from shared_modules.http_client import log_service_error
+from shared_modules.http_client import ServiceError
 from shared_modules.http_client import ServiceHTTPClient
 from shared_modules.models import Status
 from shared_modules.models.chats import Chat
 from shared_modules.models.members import Member
+from shared_modules.models.members import MembershipResult
 
 SERVICE_URL = "http://chat-service"
 
+# calls in flight at once per join or leave of many chats, when they
+# have to be made one chat at a time
+MAX_MEMBERSHIP_CALLS = 8
 
-class ChatsClient:
-    def __init__(self, http_client: ServiceHTTPClient) -> None:
-        self.http_client = http_client
+T = TypeVar("T")
+
+
+def _join_outcome(result: MembershipResult) -> Member | ServiceError:
+    if result.member is not None:
+        return result.member
+
+    error = ServiceError.from_status_code(result.status_code)
+    return error if error is not None else ServiceError.SERVICE_ERROR
+
+
+async def _for_each_chat(chat_ids: list[int],
+                         call: Callable[[int], Awaitable[T]]) -> list[T]:
+    # `call` for each chat, at most MAX_MEMBERSHIP_CALLS at a time (a
+    # session may be in every chat there is)
+    slots = asyncio.Semaphore(MAX_MEMBERSHIP_CALLS)
+
+    async def call_in_slot(chat_id: int) -> T:
+        async with slots:
+            return await call(chat_id)
+
+    return await asyncio.gather(*(call_in_slot(chat_id)
+                                  for chat_id in chat_ids))
+
+
+class ChatsClient(ServiceClient):
+    service_url = SERVICE_URL
+
+    def __init__(self, http_client: ServiceHTTPClient,
+                 cache: Cache | None = None,
+                 cache_policies: CachePolicies | None = None,
+                 bulk_membership: bool = True) -> None:
+        super().__init__(http_client, cache, cache_policies)
+        # whether to use the chat service's bulk membership routes; turned
+        # off on finding a chat service that doesn't have them
+        self.bulk_membership = bulk_membership
 
     # chats
 
+    @endpoint("POST", "/v1/chats", Chat)
     async def create_chat(self, name: str, topic: str,
                           read_privileges: int, write_privileges: int,
-                          auto_join: bool, created_by: int) -> Chat | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/chats",
-            json={
-                "name": name,
-                "topic": topic,
-                "read_privileges": read_privileges,
-                "write_privileges": write_privileges,
-                "auto_join": auto_join,
-                "created_by": created_by,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to create chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Chat(**response.json['data'])
-
-    async def get_chat(self, chat_id: int) -> Chat | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Chat(**response.json['data'])
+                          auto_join: bool, created_by: int) -> Chat | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/chats/{chat_id}", Chat, cacheable=True)
+    async def get_chat(self, chat_id: int) -> Chat | ServiceError:
+        ...
 
+    @endpoint("GET", "/v1/chats", Chat, many=True)
     async def get_chats(self,
                         name: str | None = None,
                         topic: str | None = None,
@@ -59,29 +82,10 @@ class ChatsClient:
                         auto_join: bool | None = None,
                         instance: bool | None = None,
                         status: Status | None = Status.ACTIVE,
-                        created_by: int | None = None) -> list[Chat] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/chats",
-            params={
-                "name": name,
-                "topic": topic,
-                "read_privileges": read_privileges,
-                "write_privileges": write_privileges,
-                "auto_join": auto_join,
-                "instance": instance,
-                "status": status,
-                "created_by": created_by,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get chats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Chat(**rec) for rec in response.json['data']]
+                        created_by: int | None = None) -> list[Chat] | ServiceError:
+        ...
 
+    @endpoint("PATCH", "/v1/chats/{chat_id}", Chat)
     async def partial_update_chat(self, chat_id: int,
                                   name: str | None = None,
                                   topic: str | None = None,
@@ -89,84 +93,105 @@ class ChatsClient:
                                   write_privileges: int | None = None,
                                   auto_join: bool | None = None,
                                   status: Status | None = None,
-                                  ) -> Chat | None:
-        response = await self.http_client.service_call(
-            method="PATCH",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}",
-            json={
-                "name": name,
-                "topic": topic,
-                "read_privileges": read_privileges,
-                "write_privileges": write_privileges,
-                "auto_join": auto_join,
-                "status": status,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to update chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Chat(**response.json['data'])
-
-    async def delete_chat(self, chat_id: int) -> Chat | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Chat(**response.json['data'])
+                                  ) -> Chat | ServiceError:
+        ...
+
+    @endpoint("DELETE", "/v1/chats/{chat_id}", Chat)
+    async def delete_chat(self, chat_id: int) -> Chat | ServiceError:
+        ...
 
     # members
 
+    @endpoint("POST", "/v1/chats/{chat_id}/members", Member)
     async def join_chat(self, chat_id: int, session_id: UUID, account_id: int,
-                        username: str, privileges: int) -> Member | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}/members",
-            json={
-                "session_id": session_id,
-                "account_id": account_id,
-                "username": username,
-                "privileges": privileges,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to join chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Member(**response.json['data'])
-
-    async def leave_chat(self, chat_id: int, session_id: UUID) -> Member | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}/members/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to leave chat",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Member(**response.json['data'])
-
-    async def get_members(self, chat_id: int) -> list[Member] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/chats/{chat_id}/members",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get chat members",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Member(**rec) for rec in response.json['data']]  # TODO
+                        username: str, privileges: int) -> Member | ServiceError:
+        ...
+
+    @endpoint("DELETE", "/v1/chats/{chat_id}/members/{session_id}", Member)
+    async def leave_chat(self, chat_id: int, session_id: UUID) -> Member | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/chats/{chat_id}/members", Member, many=True,
+              error_event="Failed to get chat members")
+    async def get_members(self, chat_id: int) -> list[Member] | ServiceError:
+        ...
+
+    # bulk membership
+
+    async def join_chats(self, session_id: UUID, chat_ids: Iterable[int] | None,
+                         account_id: int, username: str, privileges: int,
+                         ) -> dict[int, Member | ServiceError] | ServiceError:
+        # joins each chat, or every auto_join chat if `chat_ids` is None,
+        # in one request; the result is the outcome for each chat
+        if chat_ids is not None:
+            chat_ids = list(dict.fromkeys(chat_ids))
+
+        if self.bulk_membership:
+            response = await self.http_client.service_call(
+                method="POST",
+                url=f"{SERVICE_URL}/v1/sessions/{session_id}/chats",
+                route="/v1/sessions/{session_id}/chats",
+                json={
+                    "account_id": account_id,
+                    "username": username,
+                    "privileges": privileges,
+                    "chat_ids": chat_ids,
+                },
+            )
+            if response.error is None:
+                results = [MembershipResult(**rec) for rec in response.data]
+                return {result.chat_id: _join_outcome(result)
+                        for result in results}
+
+            # a 404 may just be an unknown session; fall back only if
+            # the route itself is missing
+            if not is_route_missing(response):
+                log_service_error("Failed to join chats", response)
+                return response.error
+            self.bulk_membership = False
+
+        if chat_ids is None:
+            chats = await self.get_chats(auto_join=True)
+            if isinstance(chats, ServiceError):
+                return chats
+            chat_ids = [chat.chat_id for chat in chats]
+
+        members = await _for_each_chat(
+            chat_ids, lambda chat_id: self.join_chat(chat_id, session_id,
+                                                     account_id, username,
+                                                     privileges))
+        return dict(zip(chat_ids, members))
+
+    async def leave_all_chats(self, session_id: UUID,
+                              chat_ids: Iterable[int] | None = None,
+                              ) -> dict[int, Member | ServiceError] | ServiceError:
+        # leaves every chat the session is in, in one request; the result
+        # has the chats left. `chat_ids`, the chats the session is known
+        # to be in, saves trying every chat should we have to fall back
+        # to leaving them one at a time.
+        if self.bulk_membership:
+            response = await self.http_client.service_call(
+                method="DELETE",
+                url=f"{SERVICE_URL}/v1/sessions/{session_id}/chats",
+                route="/v1/sessions/{session_id}/chats",
+            )
+            if response.error is None:
+                members = [Member(**rec) for rec in response.data]
+                return {member.chat_id: member for member in members}
+
+            if not is_route_missing(response):
+                log_service_error("Failed to leave chats", response)
+                return response.error
+            self.bulk_membership = False
+
+        if chat_ids is None:
+            chats = await self.get_chats()
+            if isinstance(chats, ServiceError):
+                return chats
+            chat_ids = [chat.chat_id for chat in chats]
+
+        chat_ids = list(dict.fromkeys(chat_ids))
+        results = await _for_each_chat(
+            chat_ids, lambda chat_id: self.leave_chat(chat_id, session_id))
+        return {chat_id: result for chat_id, result in zip(chat_ids, results)
+                if result is not ServiceError.NOT_FOUND}
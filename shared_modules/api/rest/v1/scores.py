@@ -1,16 +1,130 @@
+import heapq
+import time
+from typing import Any
+from typing import Callable
+
 from shared_modules import http_client
-from shared_modules import logger
+from shared_modules.api.rest.endpoints import endpoint
+from shared_modules.api.rest.endpoints import ServiceClient
+from shared_modules.cache.base import Cache
+from shared_modules.cache.base import CachePolicies
+from shared_modules.models import Status
+from shared_modules.models.scores import Leaderboard
 from shared_modules.models.scores import Score
+from shared_modules.score_index import is_personal_best_candidate
+from shared_modules.score_index import personal_best_key
+from shared_modules.score_index import ScoreIndex
 
 SERVICE_URL = "http://scores-service"
 
+# page size used when we have to build a leaderboard client-side
+LEADERBOARD_FALLBACK_PAGE_SIZE = 100
+
+# how long leaderboards are built client-side after finding a scores
+# service that can't rank them, before asking it again (it may have
+# been upgraded since)
+SERVER_LEADERBOARD_RETRY_INTERVAL = 300.0
+
+
+def _leaderboard_key(rec: dict[str, Any]) -> tuple[int, int]:
+    # personal_best_key, but for raw records from the service
+    return (rec["score"], -rec["score_id"])
+
+
+# streaming top-N of per-account best scores, in O(N) memory
+class _TopScores:
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._heap: list[tuple[tuple[int, int], int, dict[str, Any]]] = []
+        self._best: dict[int, tuple[tuple[int, int], int, dict[str, Any]]] = {}
+
+    def _is_live(self, entry: tuple[tuple[int, int], int, dict[str, Any]]) -> bool:
+        return self._best.get(entry[1]) is entry
+
+    def _prune(self) -> None:
+        # drop entries superseded by a better score from the same account
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+        if len(self._heap) > 2 * self.limit:
+            self._heap = [e for e in self._heap if self._is_live(e)]
+            heapq.heapify(self._heap)
+
+    def push(self, rec: dict[str, Any]) -> None:
+        if self.limit <= 0:
+            return
+
+        key = _leaderboard_key(rec)
+        account_id = rec["account_id"]
+
+        if (current := self._best.get(account_id)) is not None:
+            if key <= current[0]:
+                return
+        elif len(self._best) >= self.limit:
+            self._prune()
+            if key <= self._heap[0][0]:
+                return
+            evicted = heapq.heappop(self._heap)
+            del self._best[evicted[1]]
+
+        entry = (key, account_id, rec)
+        self._best[account_id] = entry
+        heapq.heappush(self._heap, entry)
+        self._prune()
+
+    def results(self) -> list[dict[str, Any]]:
+        entries = sorted(self._best.values(), key=lambda e: e[0], reverse=True)
+        return [rec for _, _, rec in entries]
+
 
-class ScoresClient:
-    def __init__(self, http_client: http_client.ServiceHTTPClient) -> None:
-        self.http_client = http_client
+def _record_submitted_score(client: "ScoresClient", score: Score,
+                            arguments: dict[str, Any]) -> None:
+    if client.score_index is not None:
+        client.score_index.record(score)
+
+
+def _record_listed_scores(client: "ScoresClient", scores: list[Score],
+                          arguments: dict[str, Any]) -> None:
+    # a single, unfiltered page of an account's scores on a map
+    # is its full history; remember the personal best from it
+    if (client.score_index is not None and
+            arguments["beatmap_md5"] is not None and
+            arguments["account_id"] is not None and
+            arguments["mode"] is not None and
+            arguments["mods"] is None and arguments["perfect"] is None and
+            arguments["passed"] in (None, True) and
+            arguments["status"] in (None, Status.ACTIVE) and
+            arguments["page"] == 1 and len(scores) < arguments["page_size"]):
+        client.score_index.record_all(arguments["account_id"],
+                                      arguments["beatmap_md5"],
+                                      arguments["mode"], scores)
+
+
+def _discard_deleted_score(client: "ScoresClient", score: Score,
+                           arguments: dict[str, Any]) -> None:
+    if client.score_index is not None:
+        client.score_index.discard(score)
+
+
+class ScoresClient(ServiceClient):
+    service_url = SERVICE_URL
+
+    def __init__(self, http_client: http_client.ServiceHTTPClient,
+                 score_index: ScoreIndex | None = None,
+                 cache: Cache | None = None,
+                 cache_policies: CachePolicies | None = None,
+                 server_leaderboards: bool = True) -> None:
+        super().__init__(http_client, cache, cache_policies)
+        self.score_index = score_index
+        # whether to have the scores service rank leaderboards itself
+        self.server_leaderboards = server_leaderboards
+        # when we last found it can't, after which they're built from
+        # scores until SERVER_LEADERBOARD_RETRY_INTERVAL has passed
+        self._leaderboard_route_missing_at: float | None = None
 
     # scores
 
+    @endpoint("POST", "/v1/scores", Score, after=_record_submitted_score)
     async def submit_score(self, beatmap_md5: str, account_id: int, username: str,
                            mode: str, mods: int, score: int, performance: float,
                            accuracy: float, max_combo: int, count_50s: int,
@@ -18,56 +132,14 @@ class ScoresClient:
                            count_katus: int, count_misses: int, grade: str,
                            passed: bool, perfect: bool, seconds_elapsed: int,
                            anticheat_flags: int, client_checksum: str,
-                           status: str) -> Score | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/scores",
-            json={
-                "beatmap_md5": beatmap_md5,
-                "account_id": account_id,
-                "username": username,
-                "mode": mode,
-                "mods": mods,
-                "score": score,
-                "performance": performance,
-                "accuracy": accuracy,
-                "max_combo": max_combo,
-                "count_50s": count_50s,
-                "count_100s": count_100s,
-                "count_300s": count_300s,
-                "count_gekis": count_gekis,
-                "count_katus": count_katus,
-                "count_misses": count_misses,
-                "grade": grade,
-                "passed": passed,
-                "perfect": perfect,
-                "seconds_elapsed": seconds_elapsed,
-                "anticheat_flags": anticheat_flags,
-                "client_checksum": client_checksum,
-                "status": status,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to submit score",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Score(**response.json['data'])
-
-    async def get_score(self, score_id: int) -> Score | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/scores/{score_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get score",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                           status: str) -> Score | http_client.ServiceError:
+        ...
 
-        return Score(**response.json['data'])
+    @endpoint("GET", "/v1/scores/{score_id}", Score, cacheable=True)
+    async def get_score(self, score_id: int) -> Score | http_client.ServiceError:
+        ...
 
+    @endpoint("GET", "/v1/scores", Score, many=True, after=_record_listed_scores)
     async def get_scores(self, beatmap_md5: str | None = None,
                          account_id: int | None = None,
                          mode: str | None = None,
@@ -77,39 +149,166 @@ class ScoresClient:
                          status: str | None = None,
                          page: int = 1,
                          page_size: int = 20,
-                         ) -> list[Score] | None:
+                         ) -> list[Score] | http_client.ServiceError:
+        ...
+
+    async def get_personal_best(self, account_id: int, beatmap_md5: str,
+                                mode: str,
+                                ) -> Score | None | http_client.ServiceError:
+        if self.score_index is not None:
+            hit, score = self.score_index.lookup(account_id, beatmap_md5, mode)
+            if hit:
+                return score
+
+        personal_best: Score | None = None
+
+        def track_personal_best(rec: dict[str, Any]) -> None:
+            nonlocal personal_best
+            if rec["score"] < (personal_best.score if personal_best else 0):
+                return  # skip building models that can't be the best
+
+            score = Score(**rec)
+            if (is_personal_best_candidate(score) and
+                    (personal_best is None or
+                     personal_best_key(score) > personal_best_key(personal_best))):
+                personal_best = score
+
+        error = await self._stream_scores(track_personal_best,
+                                          beatmap_md5=beatmap_md5,
+                                          account_id=account_id,
+                                          mode=mode,
+                                          passed=True,
+                                          status=Status.ACTIVE)
+        if error is not None:
+            return error
+
+        if self.score_index is not None:
+            self.score_index.set_best(account_id, beatmap_md5, mode,
+                                      personal_best)
+
+        return personal_best
+
+    @endpoint("DELETE", "/v1/scores/{score_id}", Score,
+              after=_discard_deleted_score)
+    async def delete_score(self, score_id: int) -> Score | http_client.ServiceError:
+        ...
+
+    # leaderboards
+
+    async def get_leaderboard(self, beatmap_md5: str, mode: str,
+                              mods: int | None = None,
+                              limit: int = 50,
+                              around_account_id: int | None = None,
+                              ) -> Leaderboard | http_client.ServiceError:
+        if not self._use_server_leaderboards():
+            return await self._build_leaderboard(beatmap_md5, mode, mods,
+                                                 limit, around_account_id)
+
         response = await self.http_client.service_call(
             method="GET",
-            url=f"{SERVICE_URL}/v1/scores",
+            url=f"{SERVICE_URL}/v1/beatmaps/{beatmap_md5}/leaderboard",
+            route="/v1/beatmaps/{beatmap_md5}/leaderboard",
             params={
-                "beatmap_md5": beatmap_md5,
-                "account_id": account_id,
                 "mode": mode,
                 "mods": mods,
-                "passed": passed,
-                "perfect": perfect,
-                "status":  status,
-                "page": page,
-                "page_size": page_size,
+                "limit": limit,
+                "around_account_id": around_account_id,
             },
         )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get scores",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+        if http_client.is_route_missing(response):
+            # scores-service can't rank server-side; build it ourselves
+            self._leaderboard_route_missing_at = time.monotonic()
+            return await self._build_leaderboard(beatmap_md5, mode, mods,
+                                                 limit, around_account_id)
 
-        return [Score(**rec) for rec in response.json['data']]
+        if response.error is not None:
+            http_client.log_service_error("Failed to get leaderboard",
+                                          response)
+            return response.error
 
-    async def delete_score(self, score_id: int) -> Score | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/scores/{score_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete score",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+        return Leaderboard(**response.data)
+
+    def _use_server_leaderboards(self) -> bool:
+        if not self.server_leaderboards:
+            return False
+
+        missing_at = self._leaderboard_route_missing_at
+        if missing_at is None:
+            return True
+        return time.monotonic() - missing_at >= SERVER_LEADERBOARD_RETRY_INTERVAL
+
+    async def _stream_scores(self, callback: Callable[[dict[str, Any]], None],
+                             **params: Any) -> http_client.ServiceError | None:
+        page = 1
+        while True:
+            response = await self.http_client.service_call(
+                method="GET",
+                url=f"{SERVICE_URL}/v1/scores",
+                route="/v1/scores",
+                params={
+                    **params,
+                    "page": page,
+                    "page_size": LEADERBOARD_FALLBACK_PAGE_SIZE,
+                },
+            )
+            if response.error is not None:
+                http_client.log_service_error("Failed to get scores", response)
+                return response.error
+
+            # compare raw records; only the survivors become models
+            records = response.data
+            for rec in records:
+                callback(rec)
+
+            if len(records) < LEADERBOARD_FALLBACK_PAGE_SIZE:
+                return None
+
+            page += 1
 
-        return Score(**response.json['data'])
+    async def _build_leaderboard(self, beatmap_md5: str, mode: str,
+                                 mods: int | None, limit: int,
+                                 around_account_id: int | None,
+                                 ) -> Leaderboard | http_client.ServiceError:
+        filters = {
+            "beatmap_md5": beatmap_md5,
+            "mode": mode,
+            "mods": mods,
+            "passed": True,
+            "status": Status.ACTIVE,
+        }
+
+        personal_best: dict[str, Any] | None = None
+        if around_account_id is not None:
+            def track_personal_best(rec: dict[str, Any]) -> None:
+                nonlocal personal_best
+                if (personal_best is None or
+                        _leaderboard_key(rec) > _leaderboard_key(personal_best)):
+                    personal_best = rec
+
+            error = await self._stream_scores(track_personal_best,
+                                              account_id=around_account_id,
+                                              **filters)
+            if error is not None:
+                return error
+
+        top_scores = _TopScores(limit)
+        # accounts ranked above the personal best; O(rank) memory
+        accounts_ahead: set[int] = set()
+
+        def consume(rec: dict[str, Any]) -> None:
+            top_scores.push(rec)
+            if (personal_best is not None and
+                    _leaderboard_key(rec) > _leaderboard_key(personal_best)):
+                accounts_ahead.add(rec["account_id"])
+
+        error = await self._stream_scores(consume, **filters)
+        if error is not None:
+            return error
+
+        return Leaderboard(
+            scores=[Score(**rec) for rec in top_scores.results()],
+            personal_best=(Score(**personal_best)
+                           if personal_best is not None else None),
+            personal_best_rank=(len(accounts_ahead) + 1
+                                if personal_best is not None else None),
+        )
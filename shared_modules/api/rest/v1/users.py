@@ -1,101 +1,106 @@
+import asyncio
 from datetime import datetime
+from typing import Any
+from typing import Iterable
+from typing import Literal
 from uuid import UUID
 
-from shared_modules import logger
+from shared_modules.api.rest.endpoints import endpoint
+from shared_modules.api.rest.endpoints import ServiceClient
+from shared_modules.cache.base import Cache
+from shared_modules.cache.base import CachePolicies
+from shared_modules.http_client import is_route_missing
+from shared_modules.http_client import log_service_error
+from shared_modules.http_client import ServiceError
 from shared_modules.http_client import ServiceHTTPClient
 from shared_modules.models.accounts import Account
 from shared_modules.models.presences import Presence
+from shared_modules.models.queued_packets import PacketPoll
 from shared_modules.models.queued_packets import QueuedPacket
 from shared_modules.models.sessions import Session
 from shared_modules.models.spectators import Spectator
 from shared_modules.models.stats import Stats
+from shared_modules.models.stats import StatsPage
+from shared_modules.rank_cache import RankCache
+from shared_modules.rank_cache import RankingSort
 
 SERVICE_URL = "http://users-service"
 
+# account ids per bulk stats request, to keep urls a sane length
+STATS_BULK_CHUNK_SIZE = 100
 
-class UsersClient:
-    def __init__(self, http_client: ServiceHTTPClient) -> None:
-        self.http_client = http_client
+# page size used when loading a mode's full rankings into the rank cache
+RANKINGS_LOAD_PAGE_SIZE = 1000
 
-    # accounts
+# how much longer than a long poll's own timeout to wait for its response
+PACKET_POLL_TIMEOUT_MARGIN = 5.0
 
-    async def sign_up(self, username: str, password_md5: str,
-                      email_address: str, country: str) -> Account | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/accounts",
-            json={
-                "username": username,
-                "password": password_md5,
-                "email_address": email_address,
-                "country": country,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to sign up",
-                         status=response.status_code,
-                         response=response.json)
-            return None
 
-        return Account(**response.json['data'])
+def _rank_stats(client: "UsersClient", stats: Stats,
+                arguments: dict[str, Any]) -> None:
+    if client.rank_cache is not None:
+        client.rank_cache.update(stats)
 
-    async def get_accounts(self) -> list[Account] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/accounts",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get accounts",
-                         status=response.status_code,
-                         response=response.json)
-            return None
 
-        return [Account(**rec) for rec in response.json['data']]
+def _rank_all_stats(client: "UsersClient", stats: list[Stats],
+                    arguments: dict[str, Any]) -> None:
+    if client.rank_cache is not None:
+        for s in stats:
+            client.rank_cache.update(s)
 
-    async def get_account(self, account_id: int) -> Account | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get account",
-                         status=response.status_code,
-                         response=response.json)
-            return None
 
-        return Account(**response.json['data'])
+def _rank_stats_page(client: "UsersClient", page: StatsPage,
+                     arguments: dict[str, Any]) -> None:
+    _rank_all_stats(client, page.stats, arguments)
 
-    async def partial_update_account(self, account_id: int,
-                                     json: dict  # TODO: model?
-                                     ) -> Account | None:
-        response = await self.http_client.service_call(
-            method="PATCH",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}",
-            json=json,
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to update account",
-                         status=response.status_code,
-                         response=response.json)
-            return None
 
-        return Account(**response.json['data'])
+def _unrank_stats(client: "UsersClient", stats: Stats,
+                  arguments: dict[str, Any]) -> None:
+    if client.rank_cache is not None:
+        client.rank_cache.discard(stats.account_id, stats.game_mode)
 
-    async def delete_account(self, account_id: int) -> Account | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete account",
-                         status=response.status_code,
-                         response=response.json)
-            return None
 
-        return Account(**response.json['data'])
+class UsersClient(ServiceClient):
+    service_url = SERVICE_URL
+
+    def __init__(self, http_client: ServiceHTTPClient,
+                 rank_cache: RankCache | None = None,
+                 cache: Cache | None = None,
+                 cache_policies: CachePolicies | None = None,
+                 ) -> None:
+        super().__init__(http_client, cache, cache_policies)
+        self.rank_cache = rank_cache
+
+    # accounts
+
+    @endpoint("POST", "/v1/accounts", Account,
+              aliases={"password_md5": "password"})
+    async def sign_up(self, username: str, password_md5: str,
+                      email_address: str, country: str) -> Account | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/accounts", Account, many=True)
+    async def get_accounts(self) -> list[Account] | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/accounts/{account_id}", Account, cacheable=True)
+    async def get_account(self, account_id: int) -> Account | ServiceError:
+        ...
+
+    @endpoint("PATCH", "/v1/accounts/{account_id}", Account, body_param="json")
+    async def partial_update_account(self, account_id: int,
+                                     json: dict  # TODO: model?
+                                     ) -> Account | ServiceError:
+        ...
+
+    @endpoint("DELETE", "/v1/accounts/{account_id}", Account)
+    async def delete_account(self, account_id: int) -> Account | ServiceError:
+        ...
 
     # stats
 
+    @endpoint("POST", "/v1/accounts/{account_id}/stats", Stats,
+              after=_rank_stats)
     async def create_stats(self,
                            account_id: int,
                            game_mode: int,
@@ -112,174 +117,118 @@ class UsersClient:
                            x_count: int,
                            sh_count: int,
                            s_count: int,
-                           a_count: int) -> Stats | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}/stats",
-            json={
-                "game_mode": game_mode,
-                "total_score": total_score,
-                "ranked_score": ranked_score,
-                "performance": performance,
-                "play_count": play_count,
-                "play_time": play_time,
-                "accuracy": accuracy,
-                "max_combo": max_combo,
-                "total_hits": total_hits,
-                "replay_views": replay_views,
-                "xh_count": xh_count,
-                "x_count": x_count,
-                "sh_count": sh_count,
-                "s_count": s_count,
-                "a_count": a_count,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to create stats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                           a_count: int) -> Stats | ServiceError:
+        ...
 
-        return Stats(**response.json['data'])
-
-    async def get_stats(self, account_id: int, game_mode: int) -> Stats | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}/stats/{game_mode}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get stats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Stats(**response.json['data'])
-
-    async def get_all_account_stats(self, account_id: int) -> list[Stats] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}/stats",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get all account stats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+    @endpoint("GET", "/v1/accounts/{account_id}/stats/{game_mode}", Stats,
+              cacheable=True, after=_rank_stats)
+    async def get_stats(self, account_id: int, game_mode: int) -> Stats | ServiceError:
+        ...
 
-        return [Stats(**rec) for rec in response.json['data']]
+    @endpoint("GET", "/v1/accounts/{account_id}/stats", Stats, many=True,
+              after=_rank_all_stats)
+    async def get_all_account_stats(self, account_id: int) -> list[Stats] | ServiceError:
+        ...
 
+    @endpoint("PATCH", "/v1/accounts/{account_id}/stats/{game_mode}", Stats,
+              body_param="json", after=_rank_stats)
     async def partial_update_stats(self, account_id: int, game_mode: int,
                                    json: dict  # TODO: model?
-                                   ) -> Stats | None:
-        response = await self.http_client.service_call(
-            method="PATCH",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}/stats/{game_mode}",
-            json=json,
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to update stats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Stats(**response.json['data'])
-
-    async def delete_stats(self, account_id: int, game_mode: int) -> Stats | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/accounts/{account_id}/stats/{game_mode}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete stats",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                                   ) -> Stats | ServiceError:
+        ...
+
+    @endpoint("DELETE", "/v1/accounts/{account_id}/stats/{game_mode}", Stats,
+              after=_unrank_stats)
+    async def delete_stats(self, account_id: int, game_mode: int) -> Stats | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/stats", Stats, many=True,
+              error_event="Failed to get stats", after=_rank_all_stats)
+    async def _get_stats_chunk(self, account_ids: list[int], game_mode: int
+                               ) -> list[Stats] | ServiceError:
+        ...
+
+    async def get_stats_many(self, account_ids: Iterable[int], game_mode: int
+                             ) -> list[Stats] | ServiceError:
+        # accounts without stats in the mode are left out
+        account_ids = list(dict.fromkeys(account_ids))
+        results = await asyncio.gather(*(
+            self._get_stats_chunk(account_ids[i:i + STATS_BULK_CHUNK_SIZE],
+                                  game_mode)
+            for i in range(0, len(account_ids), STATS_BULK_CHUNK_SIZE)
+        ))
+
+        stats: list[Stats] = []
+        for result in results:
+            if isinstance(result, ServiceError):
+                return result
+            stats.extend(result)
+
+        return stats
+
+    # rankings
+
+    @endpoint("GET", "/v1/rankings/{game_mode}", StatsPage,
+              after=_rank_stats_page)
+    async def get_rankings(self, game_mode: int,
+                           sort: RankingSort = "performance",
+                           country: str | None = None,
+                           cursor: str | None = None,
+                           limit: int = 50,
+                           ) -> StatsPage | ServiceError:
+        ...
+
+    async def load_rankings(self, game_mode: int) -> Literal[True] | ServiceError:
+        # fills the rank cache with the mode's full rankings, after
+        # which stats updates through this client keep it current
+        assert self.rank_cache is not None
+
+        stats: list[Stats] = []
+        cursor = None
+        while True:
+            page = await self.get_rankings(game_mode, cursor=cursor,
+                                           limit=RANKINGS_LOAD_PAGE_SIZE)
+            if isinstance(page, ServiceError):
+                return page
+
+            stats.extend(page.stats)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+
+        self.rank_cache.load(game_mode, stats)
+        return True
 
     # sessions
 
+    @endpoint("POST", "/v1/sessions", Session)
     async def log_in(self, identifier: str, passphrase: str,
-                     user_agent: str) -> Session | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/sessions",
-            json={
-                "identifier": identifier,
-                "passphrase": passphrase,
-                "user_agent": user_agent,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to log in",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Session(**response.json['data'])
-
-    async def log_out(self, session_id: UUID) -> Session | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/sessions/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to log out",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Session(**response.json['data'])
+                     user_agent: str) -> Session | ServiceError:
+        ...
 
-    async def get_session(self, session_id: UUID) -> Session | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/sessions/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get session",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+    @endpoint("DELETE", "/v1/sessions/{session_id}", Session)
+    async def log_out(self, session_id: UUID) -> Session | ServiceError:
+        ...
 
-        return Session(**response.json['data'])
+    @endpoint("GET", "/v1/sessions/{session_id}", Session, cacheable=True,
+              hedged=True)
+    async def get_session(self, session_id: UUID) -> Session | ServiceError:
+        ...
 
+    @endpoint("GET", "/v1/sessions", Session, many=True)
     async def get_all_sessions(self, account_id: int | None = None,
-                               user_agent: str | None = None) -> list[Session] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/sessions",
-            params={
-                "account_id": account_id,
-                "user_agent": user_agent,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get all sessions",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Session(**rec) for rec in response.json['data']]
+                               user_agent: str | None = None) -> list[Session] | ServiceError:
+        ...
 
+    @endpoint("PATCH", "/v1/sessions/{session_id}", Session)
     async def partial_update_session(self, session_id: UUID,
                                      expires_at: datetime | None,
-                                     ) -> Session | None:
-        response = await self.http_client.service_call(
-            method="PATCH",
-            url=f"{SERVICE_URL}/v1/sessions/{session_id}",
-            json={
-                "expires_at": expires_at.isoformat() if expires_at else None,
-            }
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to update session",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Session(**response.json['data'])
+                                     ) -> Session | ServiceError:
+        ...
 
     # presence
 
+    @endpoint("POST", "/v1/presences", Presence)
     async def create_presence(self, session_id: UUID, game_mode: int,
                               account_id: int,
                               username: str,
@@ -292,56 +241,20 @@ class UsersClient:
                               map_md5: str,
                               map_id: int,
                               mods: int,
+
                               osu_version: str,
                               utc_offset: int,
                               display_city: bool,
                               pm_private: bool,
-                              ) -> Presence | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/presences",
-            json={
-                "session_id": session_id,
-                "game_mode": game_mode,
-                "account_id": account_id,
-                "username": username,
-                "country_code": country_code,
-                "privileges": privileges,
-                "latitude": latitude,
-                "longitude": longitude,
-                "action": action,
-                "info_text": info_text,
-                "map_md5": map_md5,
-                "map_id": map_id,
-                "mods": mods,
-
-                "osu_version": osu_version,
-                "utc_offset": utc_offset,
-                "display_city": display_city,
-                "pm_private": pm_private,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to create presence",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Presence(**response.json['data'])
-
-    async def get_presence(self, session_id: UUID) -> Presence | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/presences/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get presence",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                              ) -> Presence | ServiceError:
+        ...
 
-        return Presence(**response.json['data'])
+    @endpoint("GET", "/v1/presences/{session_id}", Presence, cacheable=True,
+              hedged=True)
+    async def get_presence(self, session_id: UUID) -> Presence | ServiceError:
+        ...
 
+    @endpoint("GET", "/v1/presences", Presence, many=True)
     async def get_all_presences(self, game_mode: int | None = None,
                                 account_id: int | None = None,
                                 username: str | None = None,
@@ -352,30 +265,10 @@ class UsersClient:
                                 utc_offset: int | None = None,
                                 display_city: bool | None = None,
                                 pm_private: bool | None = None,
-                                ) -> list[Presence] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/presences",
-            params={
-                "game_mode": game_mode,
-                "account_id": account_id,
-                "username": username,
-                "country_code": country_code,
-                # "privileges": privileges,
-                "osu_version": osu_version,
-                "utc_offset": utc_offset,
-                "display_city": display_city,
-                "pm_private": pm_private,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get all presences",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Presence(**rec) for rec in response.json['data']]
+                                ) -> list[Presence] | ServiceError:
+        ...
 
+    @endpoint("PATCH", "/v1/presences/{session_id}", Presence)
     async def partial_update_presence(self, session_id: UUID,
                                       game_mode: int | None = None,
                                       username: str | None = None,
@@ -393,131 +286,66 @@ class UsersClient:
                                       utc_offset: int | None = None,
                                       display_city: bool | None = None,
                                       pm_private: bool | None = None,
-                                      ) -> Presence | None:
-        response = await self.http_client.service_call(
-            method="PATCH",
-            url=f"{SERVICE_URL}/v1/presences/{session_id}",
-            json={
-                "game_mode": game_mode,
-                "username": username,
-                "country_code": country_code,
-                "privileges": privileges,
-                "latitude": latitude,
-                "longitude": longitude,
-                "action": action,
-                "info_text": info_text,
-                "map_md5": map_md5,
-                "map_id": map_id,
-                "mods": mods,
-
-                "osu_version": osu_version,
-                "utc_offset": utc_offset,
-                "display_city": display_city,
-                "pm_private": pm_private,
-            },
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to update presence",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Presence(**response.json['data'])
-
-    async def delete_presence(self, session_id: UUID) -> Presence | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/presences/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete presence",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+                                      ) -> Presence | ServiceError:
+        ...
 
-        return Presence(**response.json['data'])
+    @endpoint("DELETE", "/v1/presences/{session_id}", Presence)
+    async def delete_presence(self, session_id: UUID) -> Presence | ServiceError:
+        ...
 
     # queued packets
 
-    # TODO: this returning bool is inconsistent
-    # we should probably have a ServiceError class to differentiate from
-    # returning nothing
+    @endpoint("POST", "/v1/sessions/{session_id}/queued-packets", None)
     async def enqueue_packet(self, session_id: UUID, data: list[int]
-                             ) -> bool:
+                             ) -> Literal[True] | ServiceError:
+        ...
+
+    @endpoint("GET", "/v1/sessions/{session_id}/queued-packets", QueuedPacket,
+              many=True, idempotent=False,
+              error_event="Failed to dequeue all packets")
+    async def deqeue_all_packets(self, session_id: UUID) -> list[QueuedPacket] | ServiceError:
+        ...
+
+    async def poll_queued_packets(self, session_ids: list[UUID], timeout: float
+                                  ) -> PacketPoll | None | ServiceError:
+        # dequeues the sessions' packets once any of them have some,
+        # waiting up to `timeout` seconds; see api.subscriptions. None if
+        # the users service doesn't support long polls.
         response = await self.http_client.service_call(
             method="POST",
-            url=f"{SERVICE_URL}/v1/sessions/{session_id}/queued-packets",
-            json={"data": data},
+            url=f"{SERVICE_URL}/v1/queued-packets/poll",
+            route="/v1/queued-packets/poll",
+            json={"session_ids": session_ids, "timeout": timeout},
+            timeout=timeout + PACKET_POLL_TIMEOUT_MARGIN,
+            limited=False,
         )
-        return response.status_code in range(200, 300)
-
-    async def deqeue_all_packets(self, session_id: UUID) -> list[QueuedPacket] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/sessions/{session_id}/queued-packets",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to dequeue all packets",
-                         status=response.status_code,
-                         response=response.json)
+        if is_route_missing(response):
             return None
 
-        return [QueuedPacket(**rec) for rec in response.json['data']]
+        if response.error is not None:
+            log_service_error("Failed to poll queued packets", response)
+            return response.error
+
+        return PacketPoll(**response.data)
 
     # spectators
 
+    @endpoint("POST", "/v1/sessions/{host_session_id}/spectators", Spectator)
     async def create_spectator(self, host_session_id: UUID, session_id: UUID,
-                               account_id: int) -> Spectator | None:
-        response = await self.http_client.service_call(
-            method="POST",
-            url=f"{SERVICE_URL}/v1/sessions/{host_session_id}/spectators",
-            json={"session_id": session_id,
-                  "account_id": account_id},
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to create spectator",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Spectator(**response.json['data'])
+                               account_id: int) -> Spectator | ServiceError:
+        ...
 
+    @endpoint("DELETE", "/v1/sessions/{host_session_id}/spectators/{session_id}",
+              Spectator)
     async def delete_spectator(self, host_session_id: UUID, session_id: UUID
-                               ) -> Spectator | None:
-        response = await self.http_client.service_call(
-            method="DELETE",
-            url=f"{SERVICE_URL}/v1/sessions/{host_session_id}/spectators/{session_id}",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to delete spectator",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return Spectator(**response.json['data'])
-
-    async def get_spectators(self, host_session_id: UUID) -> list[Spectator] | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/sessions/{host_session_id}/spectators",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get spectators",
-                         status=response.status_code,
-                         response=response.json)
-            return None
-
-        return [Spectator(**rec) for rec in response.json['data']]
+                               ) -> Spectator | ServiceError:
+        ...
 
-    async def get_spectator_host(self, spectator_session_id: UUID) -> UUID | None:
-        response = await self.http_client.service_call(
-            method="GET",
-            url=f"{SERVICE_URL}/v1/sessions/{spectator_session_id}/spectating",
-        )
-        if response.status_code not in range(200, 300):
-            logger.error("Failed to get spectator host",
-                         status=response.status_code,
-                         response=response.json)
-            return None
+    @endpoint("GET", "/v1/sessions/{host_session_id}/spectators", Spectator,
+              many=True)
+    async def get_spectators(self, host_session_id: UUID) -> list[Spectator] | ServiceError:
+        ...
 
-        return UUID(response.json['data'])
+    @endpoint("GET", "/v1/sessions/{spectator_session_id}/spectating", UUID)
+    async def get_spectator_host(self, spectator_session_id: UUID) -> UUID | ServiceError:
+        ...
@@ -0,0 +1,277 @@
+import asyncio
+import random
+from collections import deque
+from typing import Any
+from uuid import UUID
+
+from shared_modules import logger
+from shared_modules.api.rest.v1.users import UsersClient
+from shared_modules.http_client import ServiceError
+from shared_modules.models.queued_packets import QueuedPacket
+
+# how long the users service holds each long poll open
+POLL_TIMEOUT = 25.0
+
+# sessions per poll request, & poll requests in flight at once
+MAX_SESSIONS_PER_POLL = 1000
+MAX_POLLS = 4
+
+# sessions that come to need polling while every poll is in flight (new
+# subscriptions, & drained ones) are polled right away in more, shorter
+# polls, rather than waiting for a regular poll to come back
+OVERFLOW_POLL_TIMEOUT = 1.0
+
+# packets buffered per session before it stops being polled (its
+# packets stay queued in the users service until there's room again)
+MAX_BUFFERED_PACKETS = 1000
+
+# retry delays after failed polls; doubled per consecutive failure
+RETRY_DELAY = 0.1
+MAX_RETRY_DELAY = 5.0
+
+# how often sessions are polled without long polls, on finding a users
+# service that doesn't support them
+FALLBACK_POLL_INTERVAL = 1.0
+
+
+class PacketSubscription:
+    # one session's queued packets, delivered as they're enqueued. either
+    # iterate it (`async for packets in subscription`), or drain() it
+    # when the osu! client next polls.
+
+    def __init__(self, subscriber: "PacketSubscriber", session_id: UUID,
+                 max_buffered: int) -> None:
+        self.subscriber = subscriber
+        self.session_id = session_id
+        self.max_buffered = max_buffered
+
+        self.closed = False
+        # the session no longer exists in the users service
+        self.expired = False
+
+        self._packets: deque[QueuedPacket] = deque()
+        self._waiter: asyncio.Future[None] | None = None
+
+    @property
+    def full(self) -> bool:
+        return len(self._packets) >= self.max_buffered
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    def _deliver(self, packets: list[QueuedPacket]) -> None:
+        self._packets.extend(packets)
+        self._wake()
+
+    def _close(self, expired: bool = False) -> None:
+        self.closed = True
+        self.expired = expired
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def drain(self) -> list[QueuedPacket]:
+        packets = list(self._packets)
+        self._packets.clear()
+        if packets:
+            self.subscriber._wakeup.set()  # there's room to poll again
+        return packets
+
+    async def get(self) -> list[QueuedPacket]:
+        # waits for packets; empty only once the subscription is closed
+        while not self._packets and not self.closed:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self.drain()
+
+    def __aiter__(self) -> "PacketSubscription":
+        return self
+
+    async def __anext__(self) -> list[QueuedPacket]:
+        packets = await self.get()
+        if not packets:
+            raise StopAsyncIteration
+        return packets
+
+    def close(self) -> None:
+        self.subscriber.unsubscribe(self.session_id)
+
+
+class PacketSubscriber:
+    # delivers queued packets to subscriptions through long polls to the
+    # users service, each covering many sessions, instead of a dequeue
+    # per session per osu! client poll. polls are retried with backoff
+    # when they fail, and a session whose subscription has a full buffer
+    # isn't polled until it's drained.
+    #
+    # packets are dequeued when a poll answers, so any in a response to
+    # a poll cancelled by stop() are lost; stop it only when the sessions
+    # are going away too.
+
+    def __init__(self, users: UsersClient,
+                 poll_timeout: float = POLL_TIMEOUT,
+                 max_sessions_per_poll: int = MAX_SESSIONS_PER_POLL,
+                 max_polls: int = MAX_POLLS,
+                 max_buffered: int = MAX_BUFFERED_PACKETS) -> None:
+        self.users = users
+        self.poll_timeout = poll_timeout
+        self.max_sessions_per_poll = max_sessions_per_poll
+        self.max_polls = max_polls
+        self.max_buffered = max_buffered
+
+        # whether the users service supports long polls
+        self.long_polling = True
+
+        self.subscriptions: dict[UUID, PacketSubscription] = {}
+        self._polling: set[UUID] = set()  # sessions in a poll in flight
+        self._polls: set[asyncio.Task[None]] = set()
+        self._overflow_polls: set[asyncio.Task[None]] = set()
+
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._failures = 0
+
+        self.poll_count = 0
+        self.packet_count = 0
+        self.error_count = 0
+
+    def subscribe(self, session_id: UUID) -> PacketSubscription:
+        subscription = self.subscriptions.get(session_id)
+        if subscription is None:
+            subscription = PacketSubscription(self, session_id,
+                                              self.max_buffered)
+            self.subscriptions[session_id] = subscription
+            self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, session_id: UUID) -> None:
+        subscription = self.subscriptions.pop(session_id, None)
+        if subscription is not None:
+            subscription._close()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [*self._polls, *self._overflow_polls]
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for session_id in list(self.subscriptions):
+            self.unsubscribe(session_id)
+
+    async def __aenter__(self) -> "PacketSubscriber":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "subscriptions": len(self.subscriptions),
+            "polls_in_flight": len(self._polls) + len(self._overflow_polls),
+            "polls": self.poll_count,
+            "packets": self.packet_count,
+            "errors": self.error_count,
+        }
+
+    def _idle_sessions(self) -> list[UUID]:
+        return [session_id
+                for session_id, subscription in self.subscriptions.items()
+                if session_id not in self._polling and not subscription.full]
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            idle = self._idle_sessions()
+            while idle:
+                session_ids = idle[:self.max_sessions_per_poll]
+                if len(self._polls) < self.max_polls:
+                    self._polls.add(asyncio.create_task(
+                        self._poll(session_ids, self.poll_timeout)))
+                else:
+                    timeout = min(self.poll_timeout, OVERFLOW_POLL_TIMEOUT)
+                    self._overflow_polls.add(asyncio.create_task(
+                        self._poll(session_ids, timeout)))
+
+                self._polling.update(session_ids)
+                del idle[:self.max_sessions_per_poll]
+
+    async def _poll(self, session_ids: list[UUID], timeout: float) -> None:
+        task = asyncio.current_task()
+        try:
+            try:
+                failed = not await self._poll_once(session_ids, timeout)
+            except Exception as exc:
+                logger.warning("Failed to poll queued packets",
+                               error=repr(exc))
+                failed = True
+
+            if failed:
+                self.error_count += 1
+                self._failures += 1
+                delay = min(MAX_RETRY_DELAY,
+                            RETRY_DELAY * 2 ** (self._failures - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            else:
+                self._failures = 0
+        finally:
+            self._polling.difference_update(session_ids)
+            self._polls.discard(task)  # type: ignore[arg-type]
+            self._overflow_polls.discard(task)  # type: ignore[arg-type]
+            self._wakeup.set()
+
+    async def _poll_once(self, session_ids: list[UUID], timeout: float) -> bool:
+        self.poll_count += 1
+        if self.long_polling:
+            poll = await self.users.poll_queued_packets(session_ids, timeout)
+            if poll is None:
+                logger.warning("Users service doesn't support long polls; "
+                               "falling back to polling each session")
+                self.long_polling = False
+            elif isinstance(poll, ServiceError):
+                return False
+            else:
+                for session_id, packets in poll.packets.items():
+                    self._deliver(session_id, packets)
+                for session_id in poll.expired:
+                    self._expire(session_id)
+                return True
+
+        await asyncio.sleep(FALLBACK_POLL_INTERVAL)
+        results = await asyncio.gather(*(self.users.deqeue_all_packets(session_id)
+                                         for session_id in session_ids))
+        for session_id, packets in zip(session_ids, results):
+            if packets is ServiceError.NOT_FOUND:
+                self._expire(session_id)
+            elif not isinstance(packets, ServiceError):
+                self._deliver(session_id, packets)
+
+        return not any(isinstance(packets, ServiceError) and
+                       packets is not ServiceError.NOT_FOUND
+                       for packets in results)
+
+    def _deliver(self, session_id: UUID, packets: list[QueuedPacket]) -> None:
+        self.packet_count += len(packets)
+        subscription = self.subscriptions.get(session_id)
+        if subscription is not None and packets:
+            subscription._deliver(packets)
+
+    def _expire(self, session_id: UUID) -> None:
+        subscription = self.subscriptions.pop(session_id, None)
+        if subscription is not None:
+            subscription._close(expired=True)
@@ -0,0 +1,139 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Any
+from typing import Mapping
+from typing import NamedTuple
+
+from shared_modules import json as jsonu
+from shared_modules.models import RankedStatus
+from shared_modules.models.beatmaps import Beatmap
+
+# bump when the on-disk layout changes; older files are ignored
+FILE_FORMAT_VERSION = 1
+
+
+class BeatmapRef(NamedTuple):
+    beatmap_id: int
+    set_id: int
+    ranked_status: RankedStatus
+    mode: str
+    updated_at: datetime
+
+
+def _parse_datetime(value: datetime | str) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def beatmap_ref(rec: Mapping[str, Any]) -> BeatmapRef:
+    # from an unvalidated beatmaps-service record
+    return BeatmapRef(
+        beatmap_id=rec["beatmap_id"],
+        set_id=rec["set_id"],
+        ranked_status=RankedStatus(rec["ranked_status"]),
+        mode=rec["mode"],
+        updated_at=_parse_datetime(rec["updated_at"]),
+    )
+
+
+class BeatmapIndex:
+    # a compact md5 -> beatmap id/set/status/mode map, so resolving the
+    # map a score was set on doesn't cost a list query & a full model.
+    # entries only ever move forward in `updated_at`. the newest
+    # `updated_at` streamed from the service is the point to refresh from;
+    # one-off lookups don't move it, as maps before it may be unseen.
+
+    def __init__(self) -> None:
+        self._entries: dict[str, BeatmapRef] = {}
+        self.updated_at: datetime | None = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, md5_hash: str) -> BeatmapRef | None:
+        ref = self._entries.get(md5_hash)
+        if ref is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return ref
+
+    def record(self, md5_hash: str, ref: BeatmapRef) -> bool:
+        # whether the entry changed
+        current = self._entries.get(md5_hash)
+        if current is None or (ref.updated_at >= current.updated_at and
+                               ref != current):
+            self._entries[md5_hash] = ref
+            return True
+        return False
+
+    def record_streamed(self, rec: Mapping[str, Any]) -> bool:
+        ref = beatmap_ref(rec)
+        changed = self.record(rec["md5_hash"], ref)
+
+        if self.updated_at is None or ref.updated_at > self.updated_at:
+            self.updated_at = ref.updated_at
+        return changed
+
+    def record_beatmap(self, beatmap: Beatmap) -> None:
+        self.record(beatmap.md5_hash, BeatmapRef(
+            beatmap_id=beatmap.beatmap_id,
+            set_id=beatmap.set_id,
+            ranked_status=beatmap.ranked_status,
+            mode=beatmap.mode,
+            updated_at=beatmap.updated_at,
+        ))
+
+    def discard(self, md5_hash: str) -> None:
+        self._entries.pop(md5_hash, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.updated_at = None
+
+    def save(self, path: str) -> None:
+        data = {
+            "version": FILE_FORMAT_VERSION,
+            "updated_at": self.updated_at,
+            "entries": [(md5_hash, *ref) for md5_hash, ref in self._entries.items()],
+        }
+
+        # write aside & rename, so a crash never leaves a torn file; the
+        # temp file is unique, as several processes may save at once
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.",
+                                        suffix=".tmp",
+                                        dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(jsonu.dumps(data))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> bool:
+        try:
+            with open(path, "rb") as f:
+                data = jsonu.loads(f.read())
+        except (OSError, ValueError):
+            return False
+
+        if not isinstance(data, dict) or data.get("version") != FILE_FORMAT_VERSION:
+            return False
+
+        for md5_hash, beatmap_id, set_id, ranked_status, mode, updated_at in data["entries"]:
+            self.record(md5_hash, BeatmapRef(beatmap_id, set_id,
+                                             RankedStatus(ranked_status), mode,
+                                             _parse_datetime(updated_at)))
+
+        if data["updated_at"] is not None:
+            updated_at = _parse_datetime(data["updated_at"])
+            if self.updated_at is None or updated_at > self.updated_at:
+                self.updated_at = updated_at
+
+        return True
@@ -0,0 +1,28 @@
+from typing import TYPE_CHECKING
+
+from shared_modules._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from .base import Cache
+    from .base import CacheBackend
+    from .base import CacheError
+    from .base import CachePolicies
+    from .base import CachePolicy
+    from .memory import MemoryBackend
+    from .redis import RedisBackend
+    from .shm import SharedMemoryBackend
+
+__getattr__, __dir__ = lazy_loader(
+    __name__,
+    submodules=("base", "memory", "redis", "shm"),
+    attributes={
+        "Cache": "base",
+        "CacheBackend": "base",
+        "CacheError": "base",
+        "CachePolicies": "base",
+        "CachePolicy": "base",
+        "MemoryBackend": "memory",
+        "RedisBackend": "redis",
+        "SharedMemoryBackend": "shm",
+    },
+)
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from functools import partial
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Mapping
+from typing import TypeVar
+
+from shared_modules import json as jsonu
+from shared_modules import logger
+
+T = TypeVar("T")
+
+# how long a loader may hold a key's stampede lock
+LOCK_TTL = 10.0
+# how long to wait on another process's loader before loading anyway
+LOCK_WAIT = 1.0
+LOCK_POLL_INTERVAL = 0.02
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend:
+    # stores bytes values under str keys. ttl is in seconds; None means
+    # no expiry. subclasses implement get, set, add, mget & delete.
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # set only if absent; True if it was set
+        raise NotImplementedError
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        return [await self.get(key) for key in keys]
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class CachePolicy:
+    __slots__ = ("ttl",)
+
+    def __init__(self, ttl: float | None = 30.0) -> None:
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"CachePolicy(ttl={self.ttl!r})"
+
+
+DEFAULT_CACHE_POLICY = CachePolicy()
+
+# endpoint name -> its policy, or None to not cache it
+CachePolicies = Mapping[str, CachePolicy | None]
+
+
+class Cache:
+    # json values over a backend. backend failures are logged & treated
+    # as misses; a cache outage shouldn't become a service outage.
+
+    def __init__(self, backend: CacheBackend, namespace: str = "") -> None:
+        self.backend = backend
+        self.namespace = namespace
+
+        # key -> the in-flight load of it in this process
+        self._loads: dict[str, asyncio.Task[Any]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}" if self.namespace else key
+
+    def _backend_failed(self, operation: str, exc: Exception) -> None:
+        self.errors += 1
+        logger.warning("Cache backend failed",
+                       operation=operation,
+                       backend=type(self.backend).__name__,
+                       error=repr(exc))
+
+    async def get(self, key: str) -> Any | None:
+        try:
+            value = await self.backend.get(self._key(key))
+        except (OSError, CacheError) as exc:
+            self._backend_failed("get", exc)
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return jsonu.loads(value)
+
+    async def mget(self, keys: list[str]) -> list[Any | None]:
+        try:
+            values = await self.backend.mget([self._key(k) for k in keys])
+        except (OSError, CacheError) as exc:
+            self._backend_failed("mget", exc)
+            values = [None] * len(keys)
+
+        results = []
+        for value in values:
+            if value is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(jsonu.loads(value))
+        return results
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        try:
+            await self.backend.set(self._key(key), jsonu.dumps(value), ttl)
+        except (OSError, CacheError) as exc:
+            self._backend_failed("set", exc)
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            await self.backend.delete(*(self._key(k) for k in keys))
+        except (OSError, CacheError) as exc:
+            self._backend_failed("delete", exc)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[T]],
+                          ttl: float | None = None,
+                          should_cache: Callable[[T], bool] = lambda _: True,
+                          decode: Callable[[Any], T] = lambda value: value,
+                          ) -> T:
+        # on a miss only one coroutine per process runs `loader`, and a
+        # lock key in the backend keeps other processes from running it
+        # at the same time; the rest wait for the value to appear.
+        # `decode` turns a cached json value back into a loader result.
+        if (cached := await self.get(key)) is not None:
+            return decode(cached)
+
+        # the load runs in its own task, so that it carries on for the
+        # other waiters if the caller that started it is cancelled
+        if (load := self._loads.get(key)) is None:
+            load = asyncio.create_task(
+                self._load(key, loader, ttl, should_cache, decode))
+            self._loads[key] = load
+            load.add_done_callback(partial(self._load_done, key))
+        return await asyncio.shield(load)
+
+    def _load_done(self, key: str, load: asyncio.Task[Any]) -> None:
+        if self._loads.get(key) is load:
+            del self._loads[key]
+        if not load.cancelled():
+            load.exception()  # waiters re-raise it; don't warn if none
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[T]],
+                    ttl: float | None,
+                    should_cache: Callable[[T], bool],
+                    decode: Callable[[Any], T]) -> T:
+        lock_key = self._key(f"lock:{key}")
+        try:
+            locked = await self.backend.add(lock_key, b"1", LOCK_TTL)
+        except (OSError, CacheError) as exc:
+            self._backend_failed("add", exc)
+            locked = True  # no backend to coordinate through; just load
+
+        if not locked:
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                if (cached := await self.get(key)) is not None:
+                    return decode(cached)
+            # the other loader is slow or gone; load it ourselves
+
+        try:
+            result = await loader()
+            if should_cache(result):
+                await self.set(key, result, ttl)
+            return result
+        finally:
+            if locked:
+                await self.delete(f"lock:{key}")
@@ -0,0 +1,153 @@
+import asyncio
+from typing import Any
+
+from .base import CacheBackend
+from .base import CacheError
+
+RedisReply = bytes | str | int | list[Any] | CacheError | None
+
+
+def encode_command(*args: bytes | str | int) -> bytes:
+    chunks = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = b"%d" % arg
+        chunks.append(b"$%d\r\n%b\r\n" % (len(arg), arg))
+    return b"".join(chunks)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> RedisReply:
+    # RESP2; error replies are returned rather than raised, so the
+    # connection can be reused
+    line = await reader.readuntil(b"\r\n")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    elif prefix == b"-":
+        return CacheError(rest.decode())
+    elif prefix == b":":
+        return int(rest)
+    elif prefix == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    elif prefix == b"*":
+        length = int(rest)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    else:
+        raise CacheError(f"Unexpected reply from redis: {line!r}")
+
+
+def _milliseconds(ttl: float) -> int:
+    return max(1, int(ttl * 1000))
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    async def execute(self, *args: bytes | str | int) -> RedisReply:
+        self.writer.write(encode_command(*args))
+        await self.writer.drain()
+        return await read_reply(self.reader)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RedisBackend(CacheBackend):
+    # a small RESP client over a pool of connections; just the commands
+    # the cache needs. errors surface as OSError or CacheError.
+
+    def __init__(self, host: str = "localhost", port: int = 6379,
+                 db: int = 0, password: str | None = None,
+                 max_connections: int = 10, timeout: float = 1.0) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+
+        self._idle: list[_Connection] = []
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def _connect(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = _Connection(reader, writer)
+        try:
+            if self.password is not None:
+                self._check(await connection.execute("AUTH", self.password))
+            if self.db:
+                self._check(await connection.execute("SELECT", self.db))
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def _check(reply: RedisReply) -> Any:
+        if isinstance(reply, CacheError):
+            raise reply
+        return reply
+
+    async def execute(self, *args: bytes | str | int) -> Any:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = await asyncio.wait_for(self._connect(),
+                                                        self.timeout)
+                reply = await asyncio.wait_for(connection.execute(*args),
+                                               self.timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError) as exc:
+                # the connection's state is unknown; don't reuse it
+                if connection is not None:
+                    connection.close()
+                raise ConnectionError(
+                    f"Redis command failed: {exc!r}") from exc
+            except BaseException:
+                if connection is not None:
+                    connection.close()
+                raise
+
+            self._idle.append(connection)
+
+        return self._check(reply)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        if ttl is None:
+            await self.execute("SET", key, value)
+        else:
+            await self.execute("SET", key, value, "PX", _milliseconds(ttl))
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        if ttl is None:
+            reply = await self.execute("SET", key, value, "NX")
+        else:
+            reply = await self.execute("SET", key, value, "NX",
+                                       "PX", _milliseconds(ttl))
+        return reply is not None
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        return await self.execute("MGET", *keys)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.execute("DEL", *keys)
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
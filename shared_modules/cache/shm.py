@@ -0,0 +1,26 @@
+from .base import CacheBackend
+from shared_modules.shm_cache import SharedMemoryCache
+
+
+class SharedMemoryBackend(CacheBackend):
+    # shares one host's cached values between its worker processes
+
+    def __init__(self, cache: SharedMemoryCache) -> None:
+        self.cache = cache
+
+    async def get(self, key: str) -> bytes | None:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        # values too big for a slot just aren't cached
+        self.cache.set(key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return self.cache.add(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.cache.delete(key)
+
+    async def close(self) -> None:
+        self.cache.close()
@@ -0,0 +1,310 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import Any
+
+from shared_modules import json as jsonu
+
+# data file: a header, then appended records of
+#   kind (u8), key (i64), updated_at (f64), stored_at (f64),
+#   payload length (u32), payload crc32 (u32), payload (json)
+# a key's newest record (by updated_at) wins; older ones are dead space
+# until compact(). the index file is a snapshot of the in-memory index
+# so that opening doesn't have to scan the whole data file.
+
+_FILE_MAGIC = b"SMDC"
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("<4sHQ")  # magic, version, generation
+_RECORD_HEADER = struct.Struct("<BqddII")
+_INDEX_HEADER = struct.Struct("<4sHQQ")  # magic, version, generation, covered
+# kind, key, offset, length, updated_at, stored_at
+_INDEX_ENTRY = struct.Struct("<BqQIdd")
+
+# kind, key -> offset, length, updated_at, stored_at
+IndexEntry = tuple[int, int, float, float]
+
+# seconds after which a record is a miss, even if nothing newer has been
+# stored; bounds how stale records that nothing re-streams can get
+DEFAULT_MAX_AGE = 60 * 60.0
+
+
+def _timestamp(updated_at: datetime | str | float) -> float:
+    if isinstance(updated_at, (int, float)):
+        return float(updated_at)
+    if isinstance(updated_at, str):
+        updated_at = datetime.fromisoformat(updated_at)
+    return updated_at.timestamp()
+
+
+class DiskCache:
+    # an append-only record cache, read through mmap. any number of
+    # processes on a host can share one: appends are serialized with
+    # flock, and readers pick up other processes' appends (and
+    # compactions) the next time they miss on a lookup. a put never
+    # waits on another process's lock (it's made on the event loop);
+    # it's dropped instead, returning False.
+
+    def __init__(self, path: str,
+                 max_age: float | None = DEFAULT_MAX_AGE) -> None:
+        self.path = path
+        self.index_path = f"{path}.idx"
+        # entries stored longer ago than this are treated as misses
+        self.max_age = max_age
+
+        self._fd = -1
+        self._inode = -1
+        self._generation = 0
+        self._mmap: mmap.mmap | None = None
+        self._scanned = 0  # bytes of the data file in the index
+        self._index: dict[tuple[int, int], IndexEntry] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # files
+
+    def _open(self) -> None:
+        self._close_files()
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(fd).st_size == 0:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    generation = int.from_bytes(os.urandom(8), "little")
+                    os.write(fd, _FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION,
+                                                   generation))
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+        header = os.pread(fd, _FILE_HEADER.size, 0)
+        magic, version, generation = _FILE_HEADER.unpack(header)
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            os.close(fd)
+            raise ValueError(f"{self.path} is not a "
+                             f"v{_FILE_VERSION} disk cache")
+
+        self._fd = fd
+        self._inode = os.fstat(fd).st_ino
+        self._generation = generation
+        self._index = {}
+        self._scanned = _FILE_HEADER.size
+
+        self._load_index()
+        self._refresh()
+
+    def _close_files(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd != -1:
+            os.close(self._fd)
+            self._fd = -1
+
+    def close(self) -> None:
+        self._close_files()
+
+    def _replaced(self) -> bool:
+        # compact() in any process swaps in a new file
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _remap(self) -> None:
+        size = os.fstat(self._fd).st_size
+        if self._mmap is None or len(self._mmap) < size:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+
+    def _refresh(self) -> None:
+        if self._replaced():
+            self._open()
+            return
+
+        self._remap()
+        self._scan()
+
+    def _scan(self) -> None:
+        assert self._mmap is not None
+
+        buf = self._mmap
+        offset = self._scanned
+        while offset + _RECORD_HEADER.size <= len(buf):
+            kind, key, updated_at, stored_at, length, crc = \
+                _RECORD_HEADER.unpack_from(buf, offset)
+            start = offset + _RECORD_HEADER.size
+            end = start + length
+            if end > len(buf) or zlib.crc32(buf[start:end]) != crc:
+                break  # a torn tail, e.g. an append still in progress
+
+            self._index_record(kind, key, start, length, updated_at, stored_at)
+            offset = end
+
+        self._scanned = offset
+
+    def _index_record(self, kind: int, key: int, offset: int, length: int,
+                      updated_at: float, stored_at: float) -> None:
+        current = self._index.get((kind, key))
+        if current is None or updated_at >= current[2]:
+            self._index[(kind, key)] = (offset, length, updated_at, stored_at)
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        if len(data) < _INDEX_HEADER.size:
+            return
+
+        magic, version, generation, covered = _INDEX_HEADER.unpack_from(data)
+        if (magic != _FILE_MAGIC or version != _FILE_VERSION or
+                generation != self._generation or
+                covered > os.fstat(self._fd).st_size):
+            return  # stale, e.g. written before a compaction
+
+        for kind, key, offset, length, updated_at, stored_at in \
+                _INDEX_ENTRY.iter_unpack(data[_INDEX_HEADER.size:]):
+            self._index[(kind, key)] = (offset, length, updated_at, stored_at)
+        self._scanned = covered
+
+    def save_index(self) -> None:
+        self._refresh()
+
+        chunks = [_INDEX_HEADER.pack(_FILE_MAGIC, _FILE_VERSION,
+                                     self._generation, self._scanned)]
+        chunks.extend(_INDEX_ENTRY.pack(kind, key, *entry)
+                      for (kind, key), entry in self._index.items())
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(chunks))
+        os.replace(tmp_path, self.index_path)
+
+    # records
+
+    def get(self, kind: int, key: int,
+            min_updated_at: datetime | str | float | None = None) -> Any | None:
+        entry = self._index.get((kind, key))
+        if entry is None:
+            # maybe another process has appended it since we last looked
+            self._refresh()
+            entry = self._index.get((kind, key))
+
+        if (entry is None or self._expired(entry) or
+                (min_updated_at is not None and
+                 entry[2] < _timestamp(min_updated_at))):
+            self.misses += 1
+            return None
+
+        offset, length, _, _ = entry
+        if self._mmap is None or offset + length > len(self._mmap):
+            self._remap()  # our own append, not mapped yet
+        assert self._mmap is not None
+
+        self.hits += 1
+        return jsonu.loads(self._mmap[offset:offset + length])
+
+    def _expired(self, entry: IndexEntry) -> bool:
+        return (self.max_age is not None and
+                time.time() - entry[3] > self.max_age)
+
+    def put(self, kind: int, key: int, updated_at: datetime | str | float,
+            record: Any) -> bool:
+        updated_ts = _timestamp(updated_at)
+        current = self._index.get((kind, key))
+        if current is not None and (current[2] > updated_ts or
+                                    (current[2] == updated_ts and
+                                     not self._expired(current))):
+            return False  # nothing newer to store
+
+        payload = jsonu.dumps(record)
+        stored_at = time.time()
+        data = _RECORD_HEADER.pack(kind, key, updated_ts, stored_at,
+                                   len(payload), zlib.crc32(payload)) + payload
+
+        while True:
+            if not self._lock(blocking=False):
+                return False  # busy; it's only a cache, so don't wait
+
+            try:
+                offset = os.fstat(self._fd).st_size
+                if offset > self._scanned:
+                    self._remap()
+                    self._scan()
+                if offset == self._scanned:
+                    os.write(self._fd, data)
+                    break
+
+                # no append can be in flight while we hold the lock, so
+                # a bad tail is left over from a crash. truncating it
+                # would SIGBUS other processes reading their mappings of
+                # it, so move everyone to a clean copy instead.
+                self._rewrite()
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._open()
+
+        # index it now; mapping & scanning past it can wait for a read
+        self._index_record(kind, key, offset + _RECORD_HEADER.size,
+                           len(payload), updated_ts, stored_at)
+        return True
+
+    def compact(self) -> None:
+        # rewrites the newest record of each key into a fresh file
+        self._lock()
+        try:
+            self._remap()
+            self._scan()
+            self._rewrite()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._open()
+        self.save_index()
+
+    def _lock(self, blocking: bool = True) -> bool:
+        # locks the data file for appending, first reopening it if it's
+        # been replaced; False if not blocking & another process has it
+        operation = fcntl.LOCK_EX
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        while True:
+            try:
+                fcntl.flock(self._fd, operation)
+            except BlockingIOError:
+                return False
+
+            if not self._replaced():
+                return True
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._open()
+
+    def _rewrite(self) -> None:
+        # replaces the data file with the indexed records; the lock
+        # must be held, & everything up to the end of the file scanned
+        assert self._mmap is not None
+
+        generation = int.from_bytes(os.urandom(8), "little")
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, generation))
+            for (kind, key), entry in self._index.items():
+                offset, length, updated_at, stored_at = entry
+                payload = self._mmap[offset:offset + length]
+                f.write(_RECORD_HEADER.pack(kind, key, updated_at, stored_at,
+                                            length, zlib.crc32(payload)))
+                f.write(payload)
+        os.replace(tmp_path, self.path)
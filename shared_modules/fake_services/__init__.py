@@ -0,0 +1,29 @@
+from typing import TYPE_CHECKING
+
+from shared_modules._lazy import lazy_loader
+
+if TYPE_CHECKING:
+    from .beatmaps import FakeBeatmapsService
+    from .chats import FakeChatsService
+    from .recording import RecordingTransport
+    from .recording import ReplayTransport
+    from .redis import FakeRedisServer
+    from .scores import FakeScoresService
+    from .transport import FakeServicesTransport
+    from .users import FakeUsersService
+
+__getattr__, __dir__ = lazy_loader(
+    __name__,
+    submodules=("base", "beatmaps", "chats", "recording", "redis", "scores",
+                "transport", "users"),
+    attributes={
+        "FakeBeatmapsService": "beatmaps",
+        "FakeChatsService": "chats",
+        "FakeRedisServer": "redis",
+        "FakeScoresService": "scores",
+        "FakeServicesTransport": "transport",
+        "FakeUsersService": "users",
+        "RecordingTransport": "recording",
+        "ReplayTransport": "recording",
+    },
+)
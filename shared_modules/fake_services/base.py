@@ -0,0 +1,119 @@
+import inspect
+import re
+from datetime import datetime
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Mapping
+
+import httpx
+
+from shared_modules import json as jsonu
+
+# handlers may also be coroutines, e.g. for long polls
+RouteHandler = Callable[["FakeService", "FakeRequest"],
+                        tuple[int, Any] | Awaitable[tuple[int, Any]]]
+# one bound to its service
+BoundHandler = Callable[["FakeRequest"],
+                        tuple[int, Any] | Awaitable[tuple[int, Any]]]
+
+
+def route(method: str, template: str) -> Callable[[RouteHandler], RouteHandler]:
+    def decorator(handler: RouteHandler) -> RouteHandler:
+        handler._fake_route = (method, template)  # type: ignore[attr-defined]
+        return handler
+    return decorator
+
+
+def _compile_template(template: str) -> re.Pattern[str]:
+    pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template)
+    return re.compile(pattern)
+
+
+def now() -> str:
+    return datetime.now().isoformat()
+
+
+def to_query_value(value: Any) -> str:
+    # how httpx encodes query param values
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def matches(record: Mapping[str, Any], filters: Mapping[str, str | None]) -> bool:
+    return all(value is None or to_query_value(record.get(key)) == value
+               for key, value in filters.items())
+
+
+def paginate(records: list[Any], query: httpx.QueryParams) -> list[Any]:
+    page = int(query.get("page", 1))
+    page_size = int(query.get("page_size", 50))
+    return records[(page - 1) * page_size:page * page_size]
+
+
+def success(data: Any, status_code: int = 200) -> tuple[int, Any]:
+    return status_code, {"status": "success", "data": data}
+
+
+def failure(status_code: int, error: str, message: str) -> tuple[int, Any]:
+    return status_code, {"status": "error", "error": error, "message": message}
+
+
+def not_found(message: str) -> tuple[int, Any]:
+    return failure(404, "not_found", message)
+
+
+class FakeRequest:
+    def __init__(self, request: httpx.Request,
+                 path_params: dict[str, str]) -> None:
+        self.request = request
+        self.path_params = path_params
+        self.query = request.url.params
+
+    @property
+    def json(self) -> Any:
+        return jsonu.loads(self.request.content) if self.request.content else None
+
+
+class FakeService:
+    # an in-memory implementation of one backend service's v1 routes;
+    # subclasses declare handlers with the @route decorator
+
+    host: str
+
+    def __init__(self) -> None:
+        self._routes: list[tuple[str, re.Pattern[str], BoundHandler]] = []
+        for name in dir(type(self)):
+            attr = getattr(type(self), name)
+            if (spec := getattr(attr, "_fake_route", None)) is not None:
+                method, template = spec
+                self._routes.append((method, _compile_template(template),
+                                     getattr(self, name)))
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path_matched = False
+        for method, pattern, handler in self._routes:
+            if (match := pattern.fullmatch(request.url.path)) is None:
+                continue
+
+            path_matched = True
+            if method != request.method:
+                continue
+
+            result = handler(FakeRequest(request, match.groupdict()))
+            if inspect.isawaitable(result):
+                result = await result
+
+            status_code, body = result
+            return httpx.Response(status_code, content=jsonu.dumps(body),
+                                  headers={"Content-Type": "application/json"})
+
+        if path_matched:
+            status_code, body = failure(405, "method_not_allowed",
+                                        "Method not allowed")
+        else:
+            status_code, body = not_found("Route not found")
+
+        return httpx.Response(status_code, content=jsonu.dumps(body),
+                              headers={"Content-Type": "application/json"})
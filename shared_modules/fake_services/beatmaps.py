@@ -0,0 +1,69 @@
+from typing import Any
+
+from .base import FakeRequest
+from .base import FakeService
+from .base import matches
+from .base import not_found
+from .base import paginate
+from .base import route
+from .base import success
+
+
+class FakeBeatmapsService(FakeService):
+    # beatmaps-service is read-only for its clients; seed it with
+    # add_beatmap & add_beatmapset
+
+    host = "beatmaps-service"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.beatmaps: dict[int, dict[str, Any]] = {}
+        self.beatmapsets: dict[int, dict[str, Any]] = {}
+
+    def add_beatmap(self, **fields: Any) -> dict[str, Any]:
+        self.beatmaps[fields["beatmap_id"]] = fields
+        return fields
+
+    def add_beatmapset(self, **fields: Any) -> dict[str, Any]:
+        self.beatmapsets[fields["beatmapset_id"]] = fields
+        return fields
+
+    # beatmaps
+
+    @route("GET", "/v1/beatmaps")
+    def get_beatmaps(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {key: request.query.get(key)
+                   for key in ("set_id", "md5_hash", "mode",
+                               "ranked_status", "status")}
+        updated_after = request.query.get("updated_after")
+        return success(paginate([beatmap for beatmap in self.beatmaps.values()
+                                 if matches(beatmap, filters) and
+                                 (updated_after is None or
+                                  beatmap["updated_at"] > updated_after)],
+                                request.query))
+
+    @route("GET", "/v1/beatmaps/{beatmap_id}")
+    def get_beatmap(self, request: FakeRequest) -> tuple[int, Any]:
+        beatmap = self.beatmaps.get(int(request.path_params["beatmap_id"]))
+        if beatmap is None:
+            return not_found("Beatmap not found")
+        return success(beatmap)
+
+    # beatmapsets
+
+    @route("GET", "/v1/beatmapsets")
+    def get_beatmapsets(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {key: request.query.get(key)
+                   for key in ("artist", "creator", "title", "nsfw",
+                               "ranked_status", "status")}
+        filters["beatmapset_id"] = request.query.get("set_id")
+        return success(paginate([beatmapset for beatmapset in self.beatmapsets.values()
+                                 if matches(beatmapset, filters)],
+                                request.query))
+
+    @route("GET", "/v1/beatmapsets/{set_id}")
+    def get_beatmapset(self, request: FakeRequest) -> tuple[int, Any]:
+        beatmapset = self.beatmapsets.get(int(request.path_params["set_id"]))
+        if beatmapset is None:
+            return not_found("Beatmapset not found")
+        return success(beatmapset)
@@ -0,0 +1,175 @@
+from typing import Any
+
+from .base import failure
+from .base import FakeRequest
+from .base import FakeService
+from .base import matches
+from .base import not_found
+from .base import now
+from .base import route
+from .base import success
+
+_CHAT_FIELDS = ("name", "topic", "read_privileges", "write_privileges",
+                "auto_join", "status")
+
+
+class FakeChatsService(FakeService):
+    host = "chat-service"
+
+    def __init__(self, bulk_membership: bool = True) -> None:
+        super().__init__()
+        # off, the bulk membership routes 404 like an older chat service
+        self.bulk_membership = bulk_membership
+
+        self.chats: dict[int, dict[str, Any]] = {}
+        # chat id -> session id -> member
+        self.members: dict[int, dict[str, dict[str, Any]]] = {}
+
+        self._next_chat_id = 1
+
+    def add_chat(self, name: str, topic: str = "", read_privileges: int = 0,
+                 write_privileges: int = 0, auto_join: bool = False,
+                 instance: bool = False, created_by: int = 1,
+                 ) -> dict[str, Any]:
+        chat_id = self._next_chat_id
+        self._next_chat_id += 1
+
+        timestamp = now()
+        chat = {
+            "chat_id": chat_id,
+            "name": name,
+            "topic": topic,
+            "read_privileges": read_privileges,
+            "write_privileges": write_privileges,
+            "auto_join": auto_join,
+            "instance": instance,
+            "status": "active",
+            "updated_at": timestamp,
+            "created_at": timestamp,
+            "created_by": created_by,
+        }
+        self.chats[chat_id] = chat
+        self.members[chat_id] = {}
+        return chat
+
+    # chats
+
+    @route("POST", "/v1/chats")
+    def create_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        body = request.json
+        if any(chat["name"] == body["name"] for chat in self.chats.values()):
+            return failure(409, "conflict", "Chat already exists")
+
+        return success(self.add_chat(**body), 201)
+
+    @route("GET", "/v1/chats")
+    def get_chats(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {key: request.query.get(key)
+                   for key in ("name", "topic", "read_privileges",
+                               "write_privileges", "auto_join", "instance",
+                               "status", "created_by")}
+        return success([chat for chat in self.chats.values()
+                        if matches(chat, filters)])
+
+    @route("GET", "/v1/chats/{chat_id}")
+    def get_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        chat = self.chats.get(int(request.path_params["chat_id"]))
+        if chat is None:
+            return not_found("Chat not found")
+        return success(chat)
+
+    @route("PATCH", "/v1/chats/{chat_id}")
+    def partial_update_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        chat = self.chats.get(int(request.path_params["chat_id"]))
+        if chat is None:
+            return not_found("Chat not found")
+
+        chat.update({k: v for k, v in request.json.items()
+                     if k in _CHAT_FIELDS and v is not None})
+        chat["updated_at"] = now()
+        return success(chat)
+
+    @route("DELETE", "/v1/chats/{chat_id}")
+    def delete_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        chat_id = int(request.path_params["chat_id"])
+        chat = self.chats.pop(chat_id, None)
+        if chat is None:
+            return not_found("Chat not found")
+
+        self.members.pop(chat_id, None)
+        return success(chat)
+
+    # members
+
+    def _join(self, chat_id: int, session_id: str,
+              body: dict[str, Any]) -> tuple[int, Any]:
+        if chat_id not in self.chats:
+            return not_found("Chat not found")
+
+        members = self.members[chat_id]
+        if session_id in members:
+            return failure(409, "conflict", "Already a member")
+
+        member = {
+            "session_id": session_id,
+            "account_id": body["account_id"],
+            "chat_id": chat_id,
+            "username": body["username"],
+            "privileges": body["privileges"],
+            "joined_at": now(),
+        }
+        members[session_id] = member
+        return success(member, 201)
+
+    @route("POST", "/v1/chats/{chat_id}/members")
+    def join_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        body = request.json
+        return self._join(int(request.path_params["chat_id"]),
+                          body["session_id"], body)
+
+    @route("GET", "/v1/chats/{chat_id}/members")
+    def get_members(self, request: FakeRequest) -> tuple[int, Any]:
+        chat_id = int(request.path_params["chat_id"])
+        if chat_id not in self.chats:
+            return not_found("Chat not found")
+        return success(list(self.members[chat_id].values()))
+
+    @route("DELETE", "/v1/chats/{chat_id}/members/{session_id}")
+    def leave_chat(self, request: FakeRequest) -> tuple[int, Any]:
+        members = self.members.get(int(request.path_params["chat_id"]), {})
+        member = members.pop(request.path_params["session_id"], None)
+        if member is None:
+            return not_found("Member not found")
+        return success(member)
+
+    # bulk membership
+
+    @route("POST", "/v1/sessions/{session_id}/chats")
+    def join_chats(self, request: FakeRequest) -> tuple[int, Any]:
+        if not self.bulk_membership:
+            return not_found("Route not found")
+
+        body = request.json
+        chat_ids = body["chat_ids"]
+        if chat_ids is None:
+            chat_ids = [chat["chat_id"] for chat in self.chats.values()
+                        if chat["auto_join"] and chat["status"] == "active"]
+
+        results = []
+        for chat_id in chat_ids:
+            status_code, response = self._join(chat_id,
+                                               request.path_params["session_id"],
+                                               body)
+            results.append({"chat_id": chat_id,
+                            "status_code": status_code,
+                            "member": response.get("data")})
+        return success(results)
+
+    @route("DELETE", "/v1/sessions/{session_id}/chats")
+    def leave_all_chats(self, request: FakeRequest) -> tuple[int, Any]:
+        if not self.bulk_membership:
+            return not_found("Route not found")
+
+        session_id = request.path_params["session_id"]
+        return success([member for members in self.members.values()
+                        if (member := members.pop(session_id, None)) is not None])
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import gzip
+import zlib
+from collections import defaultdict
+from collections import deque
+from typing import Any
+from typing import Iterable
+
+import httpx
+
+from shared_modules import json as jsonu
+
+# headers which describe the body on the wire, rather than the (decoded)
+# body we record; httpx recomputes them when the response is replayed
+_TRANSPORT_HEADERS = frozenset(("content-encoding", "content-length",
+                                "transfer-encoding"))
+
+
+# request fields (json body or query) never written to a recording; the
+# value is replaced, & replays scrub requests the same way to match them
+DEFAULT_SCRUB_FIELDS = frozenset(("password", "passphrase", "password_md5",
+                                  "token", "secret", "api_key"))
+REDACTED = "[redacted]"
+
+
+def _scrub(value: Any, fields: frozenset[str]) -> Any:
+    if isinstance(value, dict):
+        return {k: REDACTED if k in fields else _scrub(v, fields)
+                for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_scrub(v, fields) for v in value]
+    return value
+
+
+def _decode_content(headers: httpx.Headers, body: bytes) -> bytes | None:
+    # the body without its content encoding, or None if it can't be
+    # decoded (e.g. an unknown encoding)
+    try:
+        for encoding in reversed(headers.get_list("content-encoding",
+                                                  split_commas=True)):
+            encoding = encoding.strip().lower()
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "deflate":
+                body = zlib.decompress(body)
+            elif encoding != "identity":
+                return None
+    except (OSError, EOFError, zlib.error):
+        return None
+    return body
+
+
+def _scrub_body(body: bytes, fields: frozenset[str]) -> bytes:
+    try:
+        data = jsonu.loads(body)
+    except ValueError:
+        # not json, so there's no telling what's in it
+        return REDACTED.encode() if fields else body
+
+    if (scrubbed := _scrub(data, fields)) != data:
+        return jsonu.dumps(scrubbed)
+    return body
+
+
+def _scrub_request(request: httpx.Request, body: bytes,
+                   fields: frozenset[str]) -> tuple[str, bytes]:
+    # the url & body to record; bodies are recorded decoded, and any
+    # that can't be read as json are redacted whole
+    url = request.url
+    for name in fields & url.params.keys():
+        url = url.copy_set_param(name, REDACTED)
+
+    if body:
+        decoded = _decode_content(request.headers, body)
+        if decoded is not None:
+            body = _scrub_body(decoded, fields)
+        elif fields:
+            body = REDACTED.encode()
+
+    return str(url), body
+
+
+def _encode_body(body: bytes) -> dict[str, str]:
+    try:
+        return {"body": body.decode()}
+    except UnicodeDecodeError:
+        return {"body": base64.b64encode(body).decode(), "encoding": "base64"}
+
+
+def _decode_body(entry: dict[str, Any]) -> bytes:
+    if entry.get("encoding") == "base64":
+        return base64.b64decode(entry["body"])
+    return entry["body"].encode()
+
+
+# method, url, body
+RequestKey = tuple[str, str, bytes]
+
+
+def _request_key(method: str, url: str, body: bytes) -> RequestKey:
+    return (method, url, body)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    # forwards requests to a real transport, and appends each exchange
+    # to a json lines file which ReplayTransport can serve back. request
+    # fields named in `scrub_fields` are redacted in the file.
+
+    def __init__(self, path: str,
+                 transport: httpx.AsyncBaseTransport | None = None,
+                 scrub_fields: Iterable[str] = DEFAULT_SCRUB_FIELDS) -> None:
+        self.path = path
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.scrub_fields = frozenset(scrub_fields)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = await request.aread()
+        response = await self.transport.handle_async_request(request)
+
+        # aread() decodes any content encoding
+        content = await response.aread()
+        await response.aclose()
+
+        headers = [(k, v) for k, v in response.headers.items()
+                   if k.lower() not in _TRANSPORT_HEADERS]
+        url, request_body = _scrub_request(request, request_body,
+                                           self.scrub_fields)
+        entry = {
+            "request": {"method": request.method, "url": url,
+                        **_encode_body(request_body)},
+            "response": {"status_code": response.status_code,
+                         "headers": headers, **_encode_body(content)},
+        }
+        await asyncio.to_thread(self._append, jsonu.dumps(entry) + b"\n")
+
+        return httpx.Response(response.status_code, headers=headers,
+                              content=content, request=request)
+
+    def _append(self, line: bytes) -> None:
+        with open(self.path, "ab") as f:
+            f.write(line)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    # serves recorded exchanges back, matched on method, url & body. when
+    # the same request was recorded several times the responses are
+    # replayed in order, repeating the last one once exhausted.
+    # `scrub_fields` must match the recording's.
+
+    def __init__(self, path: str, strict: bool = True,
+                 scrub_fields: Iterable[str] = DEFAULT_SCRUB_FIELDS) -> None:
+        self.path = path
+        self.strict = strict
+        self.scrub_fields = frozenset(scrub_fields)
+
+        self._responses: defaultdict[RequestKey, deque[dict[str, Any]]] = \
+            defaultdict(deque)
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = jsonu.loads(line)
+                request = entry["request"]
+                key = _request_key(request["method"], request["url"],
+                                   _decode_body(request))
+                self._responses[key].append(entry["response"])
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url, body = _scrub_request(request, await request.aread(),
+                                   self.scrub_fields)
+        key = _request_key(request.method, url, body)
+        responses = self._responses.get(key)
+        if not responses:
+            if self.strict:
+                raise LookupError(f"No recorded response for "
+                                  f"{request.method} {request.url}")
+
+            body = {"status": "error", "error": "not_recorded",
+                    "message": "No recorded response"}
+            return httpx.Response(404, content=jsonu.dumps(body),
+                                  headers={"Content-Type": "application/json"})
+
+        response = responses.popleft() if len(responses) > 1 else responses[0]
+        return httpx.Response(response["status_code"],
+                              headers=response["headers"],
+                              content=_decode_body(response))
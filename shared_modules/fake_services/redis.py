@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Any
+
+from shared_modules.cache.redis import read_reply
+
+
+def _encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    elif isinstance(reply, Exception):
+        return b"-ERR %b\r\n" % str(reply).encode()
+    elif isinstance(reply, str):
+        return b"+%b\r\n" % reply.encode()
+    elif isinstance(reply, int):
+        return b":%d\r\n" % reply
+    elif isinstance(reply, bytes):
+        return b"$%d\r\n%b\r\n" % (len(reply), reply)
+    else:
+        return b"*%d\r\n" % len(reply) + b"".join(map(_encode_reply, reply))
+
+
+class FakeRedisServer:
+    # an in-process server speaking enough of the redis protocol for
+    # RedisBackend (PING, AUTH, SELECT, GET, SET, MGET, DEL, FLUSHDB),
+    # so it can be tested without a real redis
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+
+        # db -> key -> (value, expires at; 0 = never)
+        self.dbs: dict[int, dict[bytes, tuple[bytes, float]]] = {}
+        self.command_count = 0
+
+        self._server: asyncio.Server | None = None
+        # connection handler -> its writer
+        self._connections: dict[asyncio.Task[Any], asyncio.StreamWriter] = {}
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # closing the connections ends their handlers, rather than
+            # leaving them to be cancelled when the loop shuts down
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "FakeRedisServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._connections[task] = writer
+
+        db = 0
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+
+                self.command_count += 1
+                name = command[0].upper()
+                if name == b"SELECT":
+                    db = int(command[1])
+                    reply: Any = "OK"
+                else:
+                    reply = self._execute(self.dbs.setdefault(db, {}),
+                                          name, command[1:])
+
+                writer.write(_encode_reply(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            del self._connections[task]
+
+    def _get(self, store: dict[bytes, tuple[bytes, float]],
+             key: bytes) -> bytes | None:
+        entry = store.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at and expires_at < time.monotonic():
+            del store[key]
+            return None
+        return value
+
+    def _execute(self, store: dict[bytes, tuple[bytes, float]],
+                 name: bytes, args: list[bytes]) -> Any:
+        if name == b"PING":
+            return "PONG"
+        elif name == b"AUTH":
+            return "OK"
+        elif name == b"GET":
+            return self._get(store, args[0])
+        elif name == b"MGET":
+            return [self._get(store, key) for key in args]
+        elif name == b"DEL":
+            return sum(store.pop(key, None) is not None for key in args)
+        elif name == b"FLUSHDB":
+            store.clear()
+            return "OK"
+        elif name == b"SET":
+            key, value = args[0], args[1]
+            options = [a.upper() for a in args[2:]]
+            if b"NX" in options and self._get(store, key) is not None:
+                return None
+
+            expires_at = 0.0
+            if b"PX" in options:
+                ttl = int(options[options.index(b"PX") + 1]) / 1000
+                expires_at = time.monotonic() + ttl
+            elif b"EX" in options:
+                ttl = int(options[options.index(b"EX") + 1])
+                expires_at = time.monotonic() + ttl
+
+            store[key] = (value, expires_at)
+            return "OK"
+        else:
+            return Exception(f"unknown command '{name.decode()}'")
@@ -0,0 +1,57 @@
+from typing import Any
+
+from .base import FakeRequest
+from .base import FakeService
+from .base import matches
+from .base import not_found
+from .base import now
+from .base import paginate
+from .base import route
+from .base import success
+
+
+class FakeScoresService(FakeService):
+    host = "scores-service"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.scores: dict[int, dict[str, Any]] = {}
+
+        self._next_score_id = 1
+
+    def add_score(self, **fields: Any) -> dict[str, Any]:
+        score_id = self._next_score_id
+        self._next_score_id += 1
+
+        timestamp = now()
+        score = {"score_id": score_id, **fields,
+                 "created_at": timestamp, "updated_at": timestamp}
+        self.scores[score_id] = score
+        return score
+
+    @route("POST", "/v1/scores")
+    def submit_score(self, request: FakeRequest) -> tuple[int, Any]:
+        return success(self.add_score(**request.json), 201)
+
+    @route("GET", "/v1/scores")
+    def get_scores(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {key: request.query.get(key)
+                   for key in ("beatmap_md5", "account_id", "mode", "mods",
+                               "passed", "perfect", "status")}
+        return success(paginate([score for score in self.scores.values()
+                                 if matches(score, filters)],
+                                request.query))
+
+    @route("GET", "/v1/scores/{score_id}")
+    def get_score(self, request: FakeRequest) -> tuple[int, Any]:
+        score = self.scores.get(int(request.path_params["score_id"]))
+        if score is None:
+            return not_found("Score not found")
+        return success(score)
+
+    @route("DELETE", "/v1/scores/{score_id}")
+    def delete_score(self, request: FakeRequest) -> tuple[int, Any]:
+        score = self.scores.pop(int(request.path_params["score_id"]), None)
+        if score is None:
+            return not_found("Score not found")
+        return success(score)
@@ -0,0 +1,97 @@
+import asyncio
+import random
+from typing import Callable
+
+import httpx
+
+from .base import FakeService
+from .beatmaps import FakeBeatmapsService
+from .chats import FakeChatsService
+from .scores import FakeScoresService
+from .users import FakeUsersService
+from shared_modules import json as jsonu
+
+
+class FakeServicesTransport(httpx.AsyncBaseTransport):
+    # serves the v1 routes of every backend service from memory, so
+    # ServiceHTTPClients can be used with no network. supports simulated
+    # latency, and random or targeted error injection.
+
+    def __init__(self, services: list[FakeService] | None = None,
+                 latency: float | Callable[[], float] = 0.0,
+                 error_rate: float = 0.0,
+                 error_status_code: int = 503) -> None:
+        if services is None:
+            services = [FakeUsersService(), FakeChatsService(),
+                        FakeScoresService(), FakeBeatmapsService()]
+
+        self.services = {service.host: service for service in services}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status_code = error_status_code
+
+        # (method, path prefix) -> [status code, remaining count]
+        self._injected_errors: dict[tuple[str, str], list[int]] = {}
+
+        self.request_count = 0
+
+    @property
+    def users(self) -> FakeUsersService:
+        return self.services["users-service"]  # type: ignore[return-value]
+
+    @property
+    def chats(self) -> FakeChatsService:
+        return self.services["chat-service"]  # type: ignore[return-value]
+
+    @property
+    def scores(self) -> FakeScoresService:
+        return self.services["scores-service"]  # type: ignore[return-value]
+
+    @property
+    def beatmaps(self) -> FakeBeatmapsService:
+        return self.services["beatmaps-service"]  # type: ignore[return-value]
+
+    def inject_error(self, method: str, path_prefix: str,
+                     status_code: int = 503, count: int = 1) -> None:
+        # status_code=0 simulates a connection failure
+        self._injected_errors[(method, path_prefix)] = [status_code, count]
+
+    def _injected_error(self, request: httpx.Request) -> int | None:
+        for (method, path_prefix), error in self._injected_errors.items():
+            if (request.method == method and
+                    request.url.path.startswith(path_prefix)):
+                status_code, remaining = error
+                if remaining <= 1:
+                    del self._injected_errors[(method, path_prefix)]
+                else:
+                    error[1] -= 1
+                return status_code
+
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status_code
+
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.request_count += 1
+
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+
+        service = self.services.get(request.url.host)
+        if service is None:
+            raise httpx.ConnectError(f"Unknown service {request.url.host!r}",
+                                     request=request)
+
+        if (status_code := self._injected_error(request)) is not None:
+            if status_code == 0:
+                raise httpx.ConnectError("Injected connection failure",
+                                         request=request)
+
+            body = {"status": "error", "error": "injected_error",
+                    "message": "Injected error"}
+            return httpx.Response(status_code, content=jsonu.dumps(body),
+                                  headers={"Content-Type": "application/json"})
+
+        return await service.handle(request)
@@ -0,0 +1,398 @@
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from uuid import uuid4
+
+from .base import failure
+from .base import FakeRequest
+from .base import FakeService
+from .base import matches
+from .base import not_found
+from .base import now
+from .base import route
+from .base import success
+from shared_modules.rank_cache import decode_cursor
+from shared_modules.rank_cache import encode_cursor
+
+SESSION_LIFETIME = timedelta(days=1)
+
+_STATS_FIELDS = ("total_score", "ranked_score", "performance", "play_count",
+                 "play_time", "accuracy", "max_combo", "total_hits",
+                 "replay_views", "xh_count", "x_count", "sh_count", "s_count",
+                 "a_count")
+
+_PRESENCE_FIELDS = ("game_mode", "account_id", "username", "country_code",
+                    "privileges", "latitude", "longitude", "action",
+                    "info_text", "map_md5", "map_id", "mods", "osu_version",
+                    "utc_offset", "display_city", "pm_private")
+
+
+def _updates(body: dict[str, Any] | None, fields: tuple[str, ...]) -> dict[str, Any]:
+    # partial updates send every field, with None for "unchanged"
+    return {k: v for k, v in (body or {}).items()
+            if k in fields and v is not None}
+
+
+class FakeUsersService(FakeService):
+    host = "users-service"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.accounts: dict[int, dict[str, Any]] = {}
+        self.passwords: dict[int, str] = {}
+        self.stats: dict[tuple[int, int], dict[str, Any]] = {}
+        self.sessions: dict[str, dict[str, Any]] = {}
+        self.presences: dict[str, dict[str, Any]] = {}
+        self.queued_packets: dict[str, list[dict[str, Any]]] = {}
+        # long polls waiting on packets to be enqueued
+        self._packet_waiters: list[asyncio.Future[None]] = []
+        # host session id -> spectator session id -> spectator
+        self.spectators: dict[str, dict[str, dict[str, Any]]] = {}
+
+        self._next_account_id = 1
+
+    # accounts
+
+    @route("POST", "/v1/accounts")
+    def sign_up(self, request: FakeRequest) -> tuple[int, Any]:
+        body = request.json
+        for account in self.accounts.values():
+            if account["username"].lower() == body["username"].lower():
+                return failure(409, "conflict", "Username already taken")
+            if account["email_address"] == body["email_address"]:
+                return failure(409, "conflict", "Email address already taken")
+
+        account_id = self._next_account_id
+        self._next_account_id += 1
+
+        timestamp = now()
+        account = {
+            "account_id": account_id,
+            "username": body["username"],
+            "safe_username": body["username"].lower().replace(" ", "_"),
+            "email_address": body["email_address"],
+            "country": body["country"],
+            "status": "active",
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        self.accounts[account_id] = account
+        self.passwords[account_id] = body["password"]
+        return success(account, 201)
+
+    @route("GET", "/v1/accounts")
+    def get_accounts(self, request: FakeRequest) -> tuple[int, Any]:
+        return success(list(self.accounts.values()))
+
+    @route("GET", "/v1/accounts/{account_id}")
+    def get_account(self, request: FakeRequest) -> tuple[int, Any]:
+        account = self.accounts.get(int(request.path_params["account_id"]))
+        if account is None:
+            return not_found("Account not found")
+        return success(account)
+
+    @route("PATCH", "/v1/accounts/{account_id}")
+    def partial_update_account(self, request: FakeRequest) -> tuple[int, Any]:
+        account = self.accounts.get(int(request.path_params["account_id"]))
+        if account is None:
+            return not_found("Account not found")
+
+        account.update(_updates(request.json, ("username", "email_address",
+                                               "country", "status")))
+        account["updated_at"] = now()
+        return success(account)
+
+    @route("DELETE", "/v1/accounts/{account_id}")
+    def delete_account(self, request: FakeRequest) -> tuple[int, Any]:
+        account_id = int(request.path_params["account_id"])
+        account = self.accounts.pop(account_id, None)
+        if account is None:
+            return not_found("Account not found")
+        return success(account)
+
+    # stats
+
+    @route("POST", "/v1/accounts/{account_id}/stats")
+    def create_stats(self, request: FakeRequest) -> tuple[int, Any]:
+        account_id = int(request.path_params["account_id"])
+        body = request.json
+        key = (account_id, body["game_mode"])
+        if key in self.stats:
+            return failure(409, "conflict", "Stats already exist")
+
+        timestamp = now()
+        stats = {
+            "account_id": account_id,
+            "game_mode": body["game_mode"],
+            **{field: body[field] for field in _STATS_FIELDS},
+            "status": "active",
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        }
+        self.stats[key] = stats
+        return success(stats, 201)
+
+    @route("GET", "/v1/accounts/{account_id}/stats")
+    def get_all_account_stats(self, request: FakeRequest) -> tuple[int, Any]:
+        account_id = int(request.path_params["account_id"])
+        return success([stats for (stats_account_id, _), stats in self.stats.items()
+                        if stats_account_id == account_id])
+
+    @route("GET", "/v1/accounts/{account_id}/stats/{game_mode}")
+    def get_stats(self, request: FakeRequest) -> tuple[int, Any]:
+        stats = self.stats.get((int(request.path_params["account_id"]),
+                                int(request.path_params["game_mode"])))
+        if stats is None:
+            return not_found("Stats not found")
+        return success(stats)
+
+    @route("PATCH", "/v1/accounts/{account_id}/stats/{game_mode}")
+    def partial_update_stats(self, request: FakeRequest) -> tuple[int, Any]:
+        stats = self.stats.get((int(request.path_params["account_id"]),
+                                int(request.path_params["game_mode"])))
+        if stats is None:
+            return not_found("Stats not found")
+
+        stats.update(_updates(request.json, _STATS_FIELDS))
+        stats["updated_at"] = now()
+        return success(stats)
+
+    @route("DELETE", "/v1/accounts/{account_id}/stats/{game_mode}")
+    def delete_stats(self, request: FakeRequest) -> tuple[int, Any]:
+        stats = self.stats.pop((int(request.path_params["account_id"]),
+                                int(request.path_params["game_mode"])), None)
+        if stats is None:
+            return not_found("Stats not found")
+        return success(stats)
+
+    @route("GET", "/v1/stats")
+    def get_stats_many(self, request: FakeRequest) -> tuple[int, Any]:
+        game_mode = int(request.query["game_mode"])
+        return success([self.stats[key] for key in
+                        ((int(account_id), game_mode)
+                         for account_id in request.query.get_list("account_ids"))
+                        if key in self.stats])
+
+    # rankings
+
+    @route("GET", "/v1/rankings/{game_mode}")
+    def get_rankings(self, request: FakeRequest) -> tuple[int, Any]:
+        game_mode = int(request.path_params["game_mode"])
+        sort = request.query.get("sort", "performance")
+        country = request.query.get("country")
+        limit = int(request.query.get("limit", 50))
+
+        entries = sorted(
+            ((-stats[sort], account_id), stats)
+            for (account_id, stats_game_mode), stats in self.stats.items()
+            if stats_game_mode == game_mode and stats["status"] == "active" and
+            country in (None, self.accounts[account_id]["country"])
+        )
+        if (cursor := request.query.get("cursor")) is not None:
+            after = decode_cursor(cursor)
+            entries = [e for e in entries if e[0] > after]
+
+        page = entries[:limit]
+        next_cursor = None
+        if page and len(entries) > limit:
+            (value, account_id), _ = page[-1]
+            next_cursor = encode_cursor(-value, account_id)
+
+        return success({"stats": [stats for _, stats in page],
+                        "next_cursor": next_cursor})
+
+    # sessions
+
+    @route("POST", "/v1/sessions")
+    def log_in(self, request: FakeRequest) -> tuple[int, Any]:
+        body = request.json
+        for account in self.accounts.values():
+            if body["identifier"] in (account["username"],
+                                      account["email_address"]):
+                break
+        else:
+            return failure(401, "unauthorized", "Invalid credentials")
+
+        if self.passwords[account["account_id"]] != body["passphrase"]:
+            return failure(401, "unauthorized", "Invalid credentials")
+
+        timestamp = datetime.now()
+        session = {
+            "session_id": str(uuid4()),
+            "account_id": account["account_id"],
+            "user_agent": body["user_agent"],
+            "expires_at": (timestamp + SESSION_LIFETIME).isoformat(),
+            "created_at": timestamp.isoformat(),
+            "updated_at": timestamp.isoformat(),
+        }
+        self.sessions[session["session_id"]] = session
+        return success(session, 201)
+
+    @route("GET", "/v1/sessions")
+    def get_all_sessions(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {"account_id": request.query.get("account_id"),
+                   "user_agent": request.query.get("user_agent")}
+        return success([session for session in self.sessions.values()
+                        if matches(session, filters)])
+
+    @route("GET", "/v1/sessions/{session_id}")
+    def get_session(self, request: FakeRequest) -> tuple[int, Any]:
+        session = self.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return not_found("Session not found")
+        return success(session)
+
+    @route("PATCH", "/v1/sessions/{session_id}")
+    def partial_update_session(self, request: FakeRequest) -> tuple[int, Any]:
+        session = self.sessions.get(request.path_params["session_id"])
+        if session is None:
+            return not_found("Session not found")
+
+        session.update(_updates(request.json, ("expires_at",)))
+        session["updated_at"] = now()
+        return success(session)
+
+    @route("DELETE", "/v1/sessions/{session_id}")
+    def log_out(self, request: FakeRequest) -> tuple[int, Any]:
+        session_id = request.path_params["session_id"]
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return not_found("Session not found")
+
+        self.queued_packets.pop(session_id, None)
+        self._wake_packet_waiters()
+        return success(session)
+
+    # presences
+
+    @route("POST", "/v1/presences")
+    def create_presence(self, request: FakeRequest) -> tuple[int, Any]:
+        body = request.json
+        presence = {"session_id": body["session_id"],
+                    **{field: body[field] for field in _PRESENCE_FIELDS}}
+        self.presences[presence["session_id"]] = presence
+        return success(presence, 201)
+
+    @route("GET", "/v1/presences")
+    def get_all_presences(self, request: FakeRequest) -> tuple[int, Any]:
+        filters = {key: request.query.get(key)
+                   for key in ("game_mode", "account_id", "username",
+                               "country_code", "osu_version", "utc_offset",
+                               "display_city", "pm_private")}
+        return success([presence for presence in self.presences.values()
+                        if matches(presence, filters)])
+
+    @route("GET", "/v1/presences/{session_id}")
+    def get_presence(self, request: FakeRequest) -> tuple[int, Any]:
+        presence = self.presences.get(request.path_params["session_id"])
+        if presence is None:
+            return not_found("Presence not found")
+        return success(presence)
+
+    @route("PATCH", "/v1/presences/{session_id}")
+    def partial_update_presence(self, request: FakeRequest) -> tuple[int, Any]:
+        presence = self.presences.get(request.path_params["session_id"])
+        if presence is None:
+            return not_found("Presence not found")
+
+        presence.update(_updates(request.json, _PRESENCE_FIELDS))
+        return success(presence)
+
+    @route("DELETE", "/v1/presences/{session_id}")
+    def delete_presence(self, request: FakeRequest) -> tuple[int, Any]:
+        presence = self.presences.pop(request.path_params["session_id"], None)
+        if presence is None:
+            return not_found("Presence not found")
+        return success(presence)
+
+    # queued packets
+
+    @route("POST", "/v1/sessions/{session_id}/queued-packets")
+    def enqueue_packet(self, request: FakeRequest) -> tuple[int, Any]:
+        session_id = request.path_params["session_id"]
+        if session_id not in self.sessions:
+            return not_found("Session not found")
+
+        packet = {"data": request.json["data"], "created_at": now()}
+        self.queued_packets.setdefault(session_id, []).append(packet)
+        self._wake_packet_waiters()
+        return success(packet, 201)
+
+    @route("GET", "/v1/sessions/{session_id}/queued-packets")
+    def dequeue_all_packets(self, request: FakeRequest) -> tuple[int, Any]:
+        session_id = request.path_params["session_id"]
+        if session_id not in self.sessions:
+            return not_found("Session not found")
+
+        return success(self.queued_packets.pop(session_id, []))
+
+    def _wake_packet_waiters(self) -> None:
+        for waiter in self._packet_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._packet_waiters.clear()
+
+    @route("POST", "/v1/queued-packets/poll")
+    async def poll_queued_packets(self, request: FakeRequest) -> tuple[int, Any]:
+        # dequeues the packets of any of the sessions, once there are some
+        # (or any of them have expired), or after `timeout` seconds
+        body = request.json
+        session_ids = body["session_ids"]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + body["timeout"]
+        while True:
+            packets = {session_id: self.queued_packets.pop(session_id)
+                       for session_id in session_ids
+                       if self.queued_packets.get(session_id)}
+            expired = [session_id for session_id in session_ids
+                       if session_id not in self.sessions]
+
+            remaining = deadline - loop.time()
+            if packets or expired or remaining <= 0:
+                return success({"packets": packets, "expired": expired})
+
+            waiter = loop.create_future()
+            self._packet_waiters.append(waiter)
+            try:
+                await asyncio.wait((waiter,), timeout=remaining)
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                    self._packet_waiters.remove(waiter)
+
+    # spectators
+
+    @route("POST", "/v1/sessions/{host_session_id}/spectators")
+    def create_spectator(self, request: FakeRequest) -> tuple[int, Any]:
+        host_session_id = request.path_params["host_session_id"]
+        body = request.json
+        spectator = {"session_id": body["session_id"],
+                     "account_id": body["account_id"],
+                     "created_at": now()}
+        spectators = self.spectators.setdefault(host_session_id, {})
+        spectators[body["session_id"]] = spectator
+        return success(spectator, 201)
+
+    @route("GET", "/v1/sessions/{host_session_id}/spectators")
+    def get_spectators(self, request: FakeRequest) -> tuple[int, Any]:
+        host_session_id = request.path_params["host_session_id"]
+        return success(list(self.spectators.get(host_session_id, {}).values()))
+
+    @route("DELETE", "/v1/sessions/{host_session_id}/spectators/{session_id}")
+    def delete_spectator(self, request: FakeRequest) -> tuple[int, Any]:
+        host_session_id = request.path_params["host_session_id"]
+        spectators = self.spectators.get(host_session_id, {})
+        spectator = spectators.pop(request.path_params["session_id"], None)
+        if spectator is None:
+            return not_found("Spectator not found")
+        return success(spectator)
+
+    @route("GET", "/v1/sessions/{session_id}/spectating")
+    def get_spectator_host(self, request: FakeRequest) -> tuple[int, Any]:
+        session_id = request.path_params["session_id"]
+        for host_session_id, spectators in self.spectators.items():
+            if session_id in spectators:
+                return success(host_session_id)
+        return not_found("Not spectating")
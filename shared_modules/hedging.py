@@ -0,0 +1,78 @@
+from collections import deque
+
+# the latency percentile after which an unanswered call is hedged
+HEDGE_PERCENTILE = 0.95
+
+# latencies kept per route, & how many must be seen before hedging
+LATENCY_WINDOW = 1000
+MIN_SAMPLES = 100
+
+# how often (in samples) the percentile is recomputed
+RECOMPUTE_INTERVAL = 50
+
+# hedges that may be saved up while under budget, for bursts
+MAX_BUDGET_BURST = 10.0
+
+
+class HedgeStats:
+    __slots__ = ("calls", "hedged", "wins", "losses", "over_budget")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.hedged = 0
+        self.wins = 0  # the hedge answered first
+        self.losses = 0  # the original answered first anyway
+        self.over_budget = 0  # due a hedge, but the budget was spent
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "wins": self.wins,
+            "losses": self.losses,
+            "over_budget": self.over_budget,
+        }
+
+
+class Hedger:
+    # decides when a route's calls are hedged: once they've gone
+    # unanswered for longer than the route's recent p95 latency, and
+    # only while hedges stay within `budget` (a fraction of calls)
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self.stats = HedgeStats()
+
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._samples = 0
+        self._delay: float | None = None
+
+        # a token bucket; each call adds `budget`, each hedge spends one
+        self._tokens = 0.0
+
+    @property
+    def delay(self) -> float | None:
+        # how long to wait on a call before hedging it; None until
+        # enough latencies have been seen
+        return self._delay
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._samples += 1
+        if (self._samples >= MIN_SAMPLES and
+                self._samples % RECOMPUTE_INTERVAL == 0):
+            latencies = sorted(self._latencies)
+            self._delay = latencies[int(len(latencies) * HEDGE_PERCENTILE)]
+
+    def start_call(self) -> None:
+        self.stats.calls += 1
+        self._tokens = min(MAX_BUDGET_BURST, self._tokens + self.budget)
+
+    def try_hedge(self) -> bool:
+        if self._tokens < 1.0:
+            self.stats.over_budget += 1
+            return False
+
+        self._tokens -= 1.0
+        self.stats.hedged += 1
+        return True
@@ -1,46 +1,294 @@
+import asyncio
+import gzip
+import time
 from enum import Enum
+from importlib.util import find_spec
 from typing import Any
 from typing import Literal
 from typing import Mapping
 
 from httpx import AsyncClient
 from httpx import Response as HTTPXResponse
+from httpx import TransportError
+from httpx import URL
 
 from shared_modules import json as jsonu
+from shared_modules import logger
+from shared_modules.hedging import Hedger
+from shared_modules.limiter import AIMDLimit
+from shared_modules.limiter import ConcurrencyLimiter
+from shared_modules.limiter import get_call_priority
+from shared_modules.limiter import Priority
 MethodTypes = Literal["POST", "PUT", "PATCH",
                       "GET", "HEAD", "DELETE", "OPTIONS"]
 
-# TODO: make some sort of ServiceError enum to represent errors coming back from
-# core services. also allows us to differentiate between no value and errors
-
 # TODO: make this able to represent the data coming from a service
 #       back better than Any (that should be the primary goal, likely)
 
 
+def _supported_content_encodings() -> tuple[str, ...]:
+    # httpx will transparently decode these when the optional
+    # decoder packages are installed (see the `compression` extra)
+    encodings = []
+    if find_spec("zstandard") is not None:
+        encodings.append("zstd")
+    if find_spec("brotli") is not None or find_spec("brotlicffi") is not None:
+        encodings.append("br")
+    encodings.extend(("gzip", "deflate"))
+    return tuple(encodings)
+
+
+ACCEPT_ENCODING = ", ".join(_supported_content_encodings())
+
+REQUEST_COMPRESSION_LEVEL = 5
+
+
+class CallStats:
+    __slots__ = ("route", "priority", "queue_wait", "request_size",
+                 "request_wire_size", "response_size", "response_wire_size")
+
+    def __init__(self, route: str | None = None,
+                 priority: Priority = Priority.INTERACTIVE,
+                 queue_wait: float = 0.0,
+                 request_size: int = 0, request_wire_size: int = 0,
+                 response_size: int = 0, response_wire_size: int = 0) -> None:
+        # the url template (e.g. "/v1/sessions/{session_id}"), when known
+        self.route = route
+        self.priority = priority
+        # seconds spent waiting on the service's concurrency limiter
+        self.queue_wait = queue_wait
+        self.request_size = request_size
+        self.request_wire_size = request_wire_size
+        self.response_size = response_size
+        self.response_wire_size = response_wire_size
+
+    def __repr__(self) -> str:
+        return (f"CallStats(route={self.route!r}, priority={self.priority.name}, "
+                f"queue_wait={self.queue_wait * 1000:.3f}ms, "
+                f"request={self.request_wire_size}/{self.request_size}, "
+                f"response={self.response_wire_size}/{self.response_size})")
+
+
+class ServiceError(str, Enum):
+    NOT_FOUND = "not_found"
+    CLIENT_ERROR = "client_error"
+    SERVICE_ERROR = "service_error"
+    TRANSPORT_ERROR = "transport_error"
+    # shed by our own concurrency limiter; the service never saw it
+    OVERLOADED = "overloaded"
+
+    # errors are falsy so `if not result:` checks written against
+    # the previous `Model | None` return types keep working
+    def __bool__(self) -> bool:
+        return False
+
+    @classmethod
+    def from_status_code(cls, status_code: int) -> "ServiceError | None":
+        if 200 <= status_code < 300:
+            return None
+        elif status_code == 404:
+            return cls.NOT_FOUND
+        elif 400 <= status_code < 500:
+            return cls.CLIENT_ERROR
+        elif status_code == 0:
+            return cls.TRANSPORT_ERROR
+        else:
+            return cls.SERVICE_ERROR
+
+
+_UNPARSED = object()
+
+
 class ServiceResponse:
-    def __init__(self, status_code: int, headers: Mapping[str, Any], content: bytes) -> None:
+    __slots__ = ("status_code", "headers", "content", "stats", "error",
+                 "_json")
+
+    def __init__(self, status_code: int, headers: Mapping[str, Any],
+                 content: bytes | memoryview,
+                 stats: CallStats | None = None) -> None:
         self.status_code = status_code
+        self.error = ServiceError.from_status_code(status_code)
         self.headers = headers
-        self.content = content
+        # a view over the buffer httpx already holds; never copied
+        self.content = memoryview(content)
+        self.stats = stats or CallStats(response_size=len(content),
+                                        response_wire_size=len(content))
+        self._json: Any = _UNPARSED
 
     @property
     def json(self) -> Any:
-        return jsonu.loads(self.content)
+        if self._json is _UNPARSED:
+            self._json = jsonu.loads(self.content)
+        return self._json
+
+    @property
+    def data(self) -> Any:
+        return self.json["data"]
+
+    @property
+    def error_details(self) -> Any:
+        # error bodies aren't guaranteed to be json (e.g. from a proxy)
+        try:
+            return self.json
+        except ValueError:
+            return bytes(self.content[:512]).decode(errors="replace")
+
+    @classmethod
+    def from_transport_error(cls, exc: TransportError,
+                             stats: CallStats | None = None,
+                             ) -> "ServiceResponse":
+        response = cls(status_code=0, headers={}, content=b"", stats=stats)
+        response._json = {"status": "error",
+                          "error": type(exc).__name__,
+                          "message": str(exc)}
+        return response
+
+    @classmethod
+    def from_shed_call(cls, stats: CallStats | None = None) -> "ServiceResponse":
+        response = cls(status_code=503, headers={}, content=b"", stats=stats)
+        response.error = ServiceError.OVERLOADED
+        response._json = {"status": "error",
+                          "error": "overloaded",
+                          "message": "Shed by the client's concurrency limiter"}
+        return response
 
     @classmethod
-    async def from_httpx_response(cls, response: HTTPXResponse) -> "ServiceResponse":
+    async def from_httpx_response(cls, response: HTTPXResponse,
+                                  stats: CallStats | None = None,
+                                  ) -> "ServiceResponse":
+        content = await response.aread()
+
+        stats = stats or CallStats()
+        stats.response_size = len(content)
+        # num_bytes_downloaded counts the bytes before content decoding, but
+        # stays at zero for responses that were never streamed (e.g. mocked)
+        stats.response_wire_size = (
+            response.num_bytes_downloaded or
+            int(response.headers.get("Content-Length", len(content)))
+        )
+
         return cls(
             status_code=response.status_code,
             headers=response.headers,
-            content=await response.aread(),
+            content=content,
+            stats=stats,
         )
 
 
+_OVERLOAD_ERRORS = frozenset((ServiceError.SERVICE_ERROR,
+                              ServiceError.TRANSPORT_ERROR))
+
+
 class ServiceHTTPClient(AsyncClient):
-    async def service_call(self, *args, **kwargs
-                           ) -> ServiceResponse:
-        if json := kwargs.get("json"):
-            kwargs["json"] = jsonu._default_processor(json)
+    def __init__(self, *args,
+                 request_compression_threshold: int | None = None,
+                 concurrency_limits: Mapping[str, int] | None = None,
+                 default_concurrency_limit: int | None = None,
+                 queue_sizes: Mapping[Priority, int] | None = None,
+                 adaptive_concurrency: bool = False,
+                 adaptive_limit_bounds: tuple[int, int] = (1, 1000),
+                 hedge_budget: float | None = None,
+                 **kwargs) -> None:
+        headers = kwargs.pop("headers", None)
+        super().__init__(*args, **kwargs)
+        self.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        if headers is not None:
+            self.headers.update(headers)
+
+        # request bodies are only compressed when the receiving service
+        # is known to accept `Content-Encoding: gzip` bodies; None disables it
+        self.request_compression_threshold = request_compression_threshold
+
+        # in-flight calls per service host (e.g. "users-service"); hosts
+        # without a limit, when there's no default, are unlimited
+        self.concurrency_limits = dict(concurrency_limits or {})
+        self.default_concurrency_limit = default_concurrency_limit
+        self.queue_sizes = queue_sizes
+        # when enabled, the limits above are just where each host starts
+        self.adaptive_concurrency = adaptive_concurrency
+        self.adaptive_limit_bounds = adaptive_limit_bounds
+        self._limiters: dict[str, ConcurrencyLimiter | None] = {}
+
+        # the most of a route's calls (e.g. 0.05 for 5%) that may be
+        # hedged, for calls made with hedge=True; None disables hedging
+        self.hedge_budget = hedge_budget
+        self._hedgers: dict[str, Hedger] = {}
+
+    def get_limiter(self, host: str) -> ConcurrencyLimiter | None:
+        try:
+            return self._limiters[host]
+        except KeyError:
+            pass
+
+        limit = self.concurrency_limits.get(host,
+                                            self.default_concurrency_limit)
+        if limit is None:
+            limiter = None
+        elif self.adaptive_concurrency:
+            min_limit, max_limit = self.adaptive_limit_bounds
+            limiter = ConcurrencyLimiter(limit, self.queue_sizes,
+                                         adaptive=AIMDLimit(limit, min_limit,
+                                                            max_limit))
+        else:
+            limiter = ConcurrencyLimiter(limit, self.queue_sizes)
+
+        self._limiters[host] = limiter
+        return limiter
+
+    def limiter_stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            host: {
+                "limit": limiter.limit,
+                "adaptive": limiter.adaptive is not None,
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued(),
+                **{priority.name.lower(): stats.as_dict()
+                   for priority, stats in limiter.stats.items()},
+            }
+            for host, limiter in self._limiters.items() if limiter is not None
+        }
+
+    def hedge_stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            route: {
+                **hedger.stats.as_dict(),
+                "delay_ms": (hedger.delay * 1000
+                             if hedger.delay is not None else None),
+            }
+            for route, hedger in self._hedgers.items()
+        }
+
+    def _encode_json_body(self, json: Any, headers: dict[str, str],
+                          stats: CallStats) -> bytes:
+        content = jsonu.dumps(json)
+        headers["Content-Type"] = "application/json"
+
+        stats.request_size = len(content)
+        if (self.request_compression_threshold is not None and
+                len(content) >= self.request_compression_threshold):
+            content = gzip.compress(content,
+                                    compresslevel=REQUEST_COMPRESSION_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+
+        stats.request_wire_size = len(content)
+        return content
+
+    async def service_call(self, *args, route: str | None = None,
+                           priority: Priority | None = None,
+                           hedge: bool = False, limited: bool = True,
+                           **kwargs) -> ServiceResponse:
+        # `hedge` marks the call as safe to send twice (an idempotent
+        # read); it's only hedged if the client has a hedge budget.
+        # `limited=False` skips the concurrency limiter, for long polls,
+        # which would otherwise hold a slot while the service sits idle.
+        stats = CallStats(route=route,
+                          priority=priority if priority is not None
+                          else get_call_priority())
+
+        if (json := kwargs.pop("json", None)) is not None:
+            headers = dict(kwargs.pop("headers", None) or {})
+            kwargs["content"] = self._encode_json_body(json, headers, stats)
+            kwargs["headers"] = headers
 
         params = {}
         if _params := kwargs.get("params"):
@@ -58,7 +306,137 @@ class ServiceHTTPClient(AsyncClient):
 
         # TODO: filter none values from json params?
 
-        httpx_response = await self.request(*args, **kwargs)
+        limiter = None
+        if limited and (self.concurrency_limits or
+                        self.default_concurrency_limit is not None):
+            url = kwargs["url"] if "url" in kwargs else args[1]
+            limiter = self.get_limiter(URL(url).host)
+
+        if hedge and route is not None and self.hedge_budget is not None:
+            return await self._hedged_send(args, kwargs, stats, limiter)
+
+        return await self._send(args, kwargs, stats, limiter)
+
+    async def _send(self, args: tuple[Any, ...], kwargs: dict[str, Any],
+                    stats: CallStats, limiter: ConcurrencyLimiter | None,
+                    acquired: asyncio.Future[None] | None = None,
+                    ) -> ServiceResponse:
+        # `acquired` is resolved once the call has a slot & is sent
+        if limiter is not None:
+            queue_wait = await limiter.acquire(stats.priority)
+            if queue_wait is None:
+                return ServiceResponse.from_shed_call(stats)
+            stats.queue_wait = queue_wait
+
+        if acquired is not None and not acquired.done():
+            acquired.set_result(None)
+
+        response = None
+        start = time.monotonic()
+        try:
+            httpx_response = await self.request(*args, **kwargs)
+            response = await ServiceResponse.from_httpx_response(httpx_response,
+                                                                 stats)
+        except TransportError as exc:
+            response = ServiceResponse.from_transport_error(exc, stats)
+        finally:
+            if limiter is not None:
+                # 5xx & transport failures are the service struggling;
+                # 4xx are the caller's problem, and say nothing of load.
+                # a cancelled call tells us nothing either way.
+                if response is not None:
+                    limiter.record(time.monotonic() - start,
+                                   dropped=response.error in _OVERLOAD_ERRORS,
+                                   route=stats.route)
+                limiter.release()
 
-        response = await ServiceResponse.from_httpx_response(httpx_response)
         return response
+
+    async def _hedged_send(self, args: tuple[Any, ...], kwargs: dict[str, Any],
+                           stats: CallStats, limiter: ConcurrencyLimiter | None,
+                           ) -> ServiceResponse:
+        assert stats.route is not None
+        hedger = self._hedgers.get(stats.route)
+        if hedger is None:
+            hedger = Hedger(self.hedge_budget or 0.0)
+            self._hedgers[stats.route] = hedger
+
+        hedger.start_call()
+        acquired = asyncio.get_running_loop().create_future()
+        primary = asyncio.ensure_future(self._send(args, kwargs, stats, limiter,
+                                                   acquired))
+        try:
+            # latencies (& so the hedge delay) are timed from when the call
+            # got a slot; time queued on our own limiter isn't the service
+            # being slow, and a hedge would only queue behind it
+            await asyncio.wait((primary, acquired),
+                               return_when=asyncio.FIRST_COMPLETED)
+            start = time.monotonic()
+            if hedger.delay is not None:
+                await asyncio.wait((primary,), timeout=hedger.delay)
+
+            if primary.done() or hedger.delay is None or not hedger.try_hedge():
+                response = await primary
+                if response.error is not ServiceError.OVERLOADED:
+                    hedger.observe(time.monotonic() - start)
+                return response
+
+            hedge_stats = CallStats(route=stats.route, priority=stats.priority,
+                                    request_size=stats.request_size,
+                                    request_wire_size=stats.request_wire_size)
+            secondary = asyncio.ensure_future(self._send(args, kwargs,
+                                                         hedge_stats, limiter))
+            try:
+                done, pending = await asyncio.wait(
+                    (primary, secondary), return_when=asyncio.FIRST_COMPLETED)
+                # the original wins ties, and a failure isn't an answer
+                # while the other call may still succeed
+                finished = [task for task in (primary, secondary)
+                            if task in done]
+                first = next((task for task in finished
+                              if task.result().error not in _OVERLOAD_ERRORS),
+                             None)
+                if first is None:
+                    first = pending.pop() if pending else finished[0]
+                response = await first
+            finally:
+                secondary.cancel()
+
+            if first is secondary:
+                hedger.stats.wins += 1
+            else:
+                hedger.stats.losses += 1
+            hedger.observe(time.monotonic() - start)
+            return response
+        finally:
+            primary.cancel()
+            acquired.cancel()
+
+
+def is_route_missing(response: ServiceResponse) -> bool:
+    # whether the service lacks the route called (e.g. it's an older
+    # version), rather than the resource asked for. handlers' 404s are
+    # always our not_found errors; anything else came from the router.
+    if response.status_code in (405, 501):
+        return True
+    elif response.status_code != 404:
+        return False
+
+    details = response.error_details
+    return (not isinstance(details, dict) or
+            details.get("error") != "not_found" or
+            details.get("message") == "Route not found")
+
+
+def log_service_error(event: str, response: ServiceResponse) -> None:
+    # a missing resource is an expected outcome the caller handles
+    if response.error is ServiceError.NOT_FOUND:
+        return
+
+    # repeats are rate limited (& counted) by the logger's EventRateLimiter
+    logger.error(event,
+                 route=response.stats.route,
+                 status=response.status_code,
+                 error=response.error,
+                 queue_wait_ms=round(response.stats.queue_wait * 1000, 3),
+                 response=response.error_details)
@@ -1,12 +1,19 @@
+import sys
 import uuid
 from typing import Any
 
 import orjson
-from pydantic import BaseModel
+
+
+def _is_pydantic_model(data: Any, /) -> bool:
+    # pydantic is only imported by whoever defines models; if it isn't
+    # loaded yet, `data` can't be a model and we don't pay for the import
+    pydantic = sys.modules.get("pydantic")
+    return pydantic is not None and isinstance(data, pydantic.BaseModel)
 
 
 def _default_processor(data: Any, /) -> Any:
-    if isinstance(data, BaseModel):
+    if _is_pydantic_model(data):
         return _default_processor(data.dict())
     elif isinstance(data, dict):
         return {k: _default_processor(v) for k, v in data.items()}
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Iterator
+from typing import Mapping
+
+
+class Priority(IntEnum):
+    # lower values are admitted first
+    INTERACTIVE = 0  # a player is waiting on it
+    BACKGROUND = 1  # needed soon, but nobody's blocked on it
+    BULK = 2  # warmups, backfills, batch jobs
+
+
+DEFAULT_QUEUE_SIZES: Mapping[Priority, int] = {
+    Priority.INTERACTIVE: 1000,
+    Priority.BACKGROUND: 200,
+    Priority.BULK: 50,
+}
+
+_CALL_PRIORITY: ContextVar[Priority] = ContextVar("call_priority",
+                                                  default=Priority.INTERACTIVE)
+
+
+def get_call_priority() -> Priority:
+    return _CALL_PRIORITY.get()
+
+
+@contextmanager
+def call_priority(priority: Priority) -> Iterator[None]:
+    # service calls made within (including from tasks created within)
+    # are scheduled at `priority`
+    token = _CALL_PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _CALL_PRIORITY.reset(token)
+
+
+class PriorityStats:
+    __slots__ = ("admitted", "shed", "total_wait", "max_wait")
+
+    def __init__(self) -> None:
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "mean_wait_ms": (self.total_wait / self.admitted * 1000
+                             if self.admitted else 0.0),
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# the weight of each latency in a route's moving average
+LATENCY_SMOOTHING = 0.05
+
+
+class RouteLatency:
+    # a route's latency: the lowest seen recently (i.e. unloaded), and a
+    # moving average. the baseline is the min of this window (of `window`
+    # seconds) & the last, so it can rise again if calls get slower for
+    # good, e.g. after a deploy.
+    __slots__ = ("window", "smoothed", "_window_min", "_previous_window_min",
+                 "_window_end")
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.smoothed: float | None = None
+        self._window_min = float("inf")
+        self._previous_window_min = float("inf")
+        self._window_end = time.monotonic() + window
+
+    @property
+    def baseline(self) -> float:
+        return min(self._window_min, self._previous_window_min)
+
+    def observe(self, latency: float, now: float) -> None:
+        if now >= self._window_end:
+            self._previous_window_min = self._window_min
+            self._window_min = float("inf")
+            self._window_end = now + self.window
+        self._window_min = min(self._window_min, latency)
+
+        if self.smoothed is None:
+            self.smoothed = latency
+        else:
+            self.smoothed += (latency - self.smoothed) * LATENCY_SMOOTHING
+
+
+class AIMDLimit:
+    # additive increase, multiplicative decrease of a concurrency limit,
+    # after netflix's concurrency-limits. while the limit is being used,
+    # it grows by about one per round trip (1/limit per sample), and it's
+    # cut by `backoff_ratio` when a call fails, or when its route's
+    # average latency exceeds `tolerance` times the route's baseline (its
+    # lowest latency seen recently, i.e. the service unloaded). routes are
+    # only compared with themselves, as some are slower than others even
+    # unloaded, and averaged so that one slow call isn't taken for load.
+
+    def __init__(self, initial_limit: int = 20, min_limit: int = 1,
+                 max_limit: int = 1000, backoff_ratio: float = 0.9,
+                 tolerance: float = 2.0,
+                 baseline_window: float = 60.0) -> None:
+        self.limit = initial_limit
+        self._limit = float(initial_limit)  # fractional increases add up
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.baseline_window = baseline_window
+
+        # by route; None for calls made without one
+        self.routes: dict[str | None, RouteLatency] = {}
+
+        self._last_backoff = 0.0
+
+    def on_sample(self, latency: float, in_flight: int, dropped: bool,
+                  route: str | None = None) -> int:
+        now = time.monotonic()
+        route_latency = self.routes.get(route)
+        if route_latency is None:
+            route_latency = self.routes[route] = \
+                RouteLatency(self.baseline_window)
+        if not dropped:
+            route_latency.observe(latency, now)
+
+        baseline = route_latency.baseline
+        smoothed = route_latency.smoothed
+        if dropped or (smoothed is not None and
+                       smoothed > baseline * self.tolerance):
+            # back off at most once per round trip; the calls already
+            # in flight at the old limit would otherwise compound it
+            if now - self._last_backoff >= min(baseline, latency):
+                self._last_backoff = now
+                self._limit = max(self.min_limit,
+                                  self._limit * self.backoff_ratio)
+        elif in_flight * 2 >= self.limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+        self.limit = int(self._limit)
+        return self.limit
+
+
+class ConcurrencyLimiter:
+    # caps in-flight calls to one service. calls over the limit queue by
+    # priority, and a free slot always goes to the most important waiter;
+    # each priority's queue is bounded, and calls beyond it are shed
+    # rather than left to time out.
+
+    def __init__(self, limit: int,
+                 queue_sizes: Mapping[Priority, int] | None = None,
+                 adaptive: AIMDLimit | None = None) -> None:
+        self.limit = adaptive.limit if adaptive is not None else limit
+        # adjusts `limit` from the samples given to record()
+        self.adaptive = adaptive
+        self.queue_sizes = dict(DEFAULT_QUEUE_SIZES)
+        self.queue_sizes.update(queue_sizes or {})
+
+        self.in_flight = 0
+        self._waiters: dict[Priority, deque[asyncio.Future[None]]] = {
+            priority: deque() for priority in Priority
+        }
+
+        self.stats = {priority: PriorityStats() for priority in Priority}
+
+    def queued(self, priority: Priority | None = None) -> int:
+        if priority is not None:
+            return len(self._waiters[priority])
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _admit(self, priority: Priority, waited: float) -> None:
+        stats = self.stats[priority]
+        stats.admitted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE,
+                      ) -> float | None:
+        # the seconds spent queued, or None if the call was shed
+        if self.in_flight < self.limit and not self.queued():
+            self.in_flight += 1
+            self._admit(priority, 0.0)
+            return 0.0
+
+        waiters = self._waiters[priority]
+        if len(waiters) >= self.queue_sizes[priority]:
+            self.stats[priority].shed += 1
+            return None
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        start = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed a slot just as we were cancelled
+            else:
+                # _wake_waiters may have already popped (& skipped) it
+                try:
+                    waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+        waited = time.monotonic() - start
+        self._admit(priority, waited)
+        return waited
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def record(self, latency: float, dropped: bool,
+               route: str | None = None) -> None:
+        # the outcome of a call made in a slot, before it's released
+        if self.adaptive is not None:
+            self.set_limit(self.adaptive.on_sample(latency, self.in_flight,
+                                                   dropped, route))
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        # slots are handed over directly, so a newcomer can't take one
+        # out from under a waiter that's been woken but not yet resumed
+        for waiters in self._waiters.values():
+            while waiters and self.in_flight < self.limit:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self.in_flight += 1
+            if self.in_flight >= self.limit:
+                return
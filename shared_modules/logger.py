@@ -1,14 +1,27 @@
 import logging as stdlib_logging
 import os
+import random
 import sys
+import threading
+import time
+from collections import deque
 from contextvars import ContextVar
+from datetime import datetime
+from datetime import timezone
 from types import TracebackType
 from typing import Any
+from typing import Literal
+from typing import Mapping
+from typing import TextIO
 
+import orjson
 import structlog
 from structlog.types import EventDict
+from structlog.types import Processor
 from structlog.types import WrappedLogger
 
+from shared_modules import json as jsonu
+
 _ROOT_LOGGER = stdlib_logging.getLogger()
 
 _REQUEST_ID_CONTEXT = ContextVar("request_id")
@@ -36,34 +49,326 @@ def add_process_id(_: WrappedLogger, __: str, event_dict: EventDict) -> EventDic
 
 
 def add_request_id(_: WrappedLogger, __: str, event_dict: EventDict) -> EventDict:
-    if request_id := _REQUEST_ID_CONTEXT.get(None):
+    # records formatted off-thread carry the request id they were logged with
+    record = event_dict.get("_record")
+    if request_id := (getattr(record, "request_id", None) or
+                      _REQUEST_ID_CONTEXT.get(None)):
         event_dict["request_id"] = request_id
 
     return event_dict
 
 
-def configure_logging(app_env: str, log_level: str | int) -> None:
+def add_timestamp(_: WrappedLogger, __: str, event_dict: EventDict) -> EventDict:
+    # use the record's creation time, not the (possibly later) format time
+    record = event_dict.get("_record")
+    timestamp = (datetime.fromtimestamp(record.created, tz=timezone.utc)
+                 if record is not None else datetime.now(tz=timezone.utc))
+    event_dict["timestamp"] = timestamp.isoformat().replace("+00:00", "Z")
+    return event_dict
+
+
+def _json_default(obj: Any, /) -> Any:
+    # orjson natively covers uuids, datetimes, enums & dataclasses
+    processed = jsonu._default_processor(obj)
+    if processed is not obj:
+        return processed
+
+    # a log line must never fail to render
+    return repr(obj)
+
+
+def render_json(logger: WrappedLogger, method_name: str,
+                event_dict: EventDict) -> str:
+    event_dict = structlog.processors.format_exc_info(logger, method_name,
+                                                      event_dict)
+    # stdlib formatters must return str, so this is the only copy we make
+    return orjson.dumps(event_dict, default=_json_default,
+                        option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def capture_exc_info(_: WrappedLogger, method_name: str,
+                     event_dict: EventDict) -> EventDict:
+    # exc_info=True has to be resolved on the thread handling the
+    # exception, before the record is handed to the background writer
+    exc_info = event_dict.get("exc_info", method_name == "exception")
+    if exc_info is True:
+        event_dict["exc_info"] = sys.exc_info()
+    elif isinstance(exc_info, BaseException):
+        event_dict["exc_info"] = (type(exc_info), exc_info,
+                                  exc_info.__traceback__)
+    return event_dict
+
+
+SUPPRESSED_EVENTS_EVENT = "Suppressed similar events"
+
+# the most (event, level) keys tracked at once; past it, keys that have
+# nothing to report are forgotten early
+MAX_RATE_LIMITED_EVENTS = 10_000
+
+
+class EventRateLimiter:
+    # a token bucket per (event, level), plus optional probabilistic
+    # sampling per level (e.g. {"debug": 0.01}). dropped events are counted
+    # and reported on the event's next emitted line (as
+    # `events_suppressed`), and every `summary_interval` in a summary of
+    # all events suppressed since. a summary takes the place of a dropped
+    # event (so it's logged at that event's level), or if none is dropped
+    # when it's due, rides on the emitted line (as `suppressed_events`).
+
+    def __init__(self, rate: float = 10.0, burst: int = 100,
+                 sample_rates: Mapping[str, float] | None = None,
+                 summary_interval: float = 10.0,
+                 max_events: int = MAX_RATE_LIMITED_EVENTS) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.sample_rates = dict(sample_rates or {})
+        self.summary_interval = summary_interval
+        self.max_events = max_events
+
+        # key -> [tokens, last refill, suppressed count]
+        self._buckets: dict[tuple[Any, str], list[float]] = {}
+        self._last_sweep = time.monotonic()
+        # events are logged from any thread
+        self._lock = threading.Lock()
+
+    def __call__(self, _: WrappedLogger, method_name: str,
+                 event_dict: EventDict) -> EventDict:
+        now = time.monotonic()
+        key = (event_dict.get("event"), method_name)
+        sample_rate = self.sample_rates.get(method_name)
+
+        with self._lock:
+            summary = None
+            if now - self._last_sweep >= self.summary_interval:
+                summary = self._sweep(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_events:
+                    self._forget_idle(now, 0.0)
+                bucket = [float(self.burst), now, 0]
+                if len(self._buckets) < self.max_events:
+                    self._buckets[key] = bucket
+
+            dropped = sample_rate is not None and \
+                random.random() >= sample_rate
+            if not dropped:
+                bucket[0] = min(self.burst,
+                                bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                dropped = bucket[0] < 1
+
+            if dropped:
+                bucket[2] += 1
+                if not summary:
+                    raise structlog.DropEvent
+                return self._summary_event(event_dict, summary)
+
+            bucket[0] -= 1
+            suppressed = int(bucket[2])
+            bucket[2] = 0
+
+        if suppressed:
+            event_dict["events_suppressed"] = suppressed
+        if summary:
+            event_dict["suppressed_events"] = summary
+        return event_dict
+
+    def _sweep(self, now: float) -> list[dict[str, Any]]:
+        # the events suppressed since the last sweep, whose counts are
+        # reset; keys idle since then are forgotten. the lock must be held.
+        self._last_sweep = now
+
+        summary = []
+        for key, bucket in self._buckets.items():
+            if bucket[2]:
+                summary.append({"event": key[0], "level": key[1],
+                                "count": int(bucket[2])})
+                bucket[2] = 0
+
+        self._forget_idle(now, self.summary_interval)
+        return summary
+
+    def _forget_idle(self, now: float, idle_for: float) -> None:
+        # keys with nothing to report, & unused for `idle_for` seconds
+        self._buckets = {key: bucket
+                         for key, bucket in self._buckets.items()
+                         if bucket[2] or now - bucket[1] < idle_for}
+
+    def _summary_event(self, event_dict: EventDict,
+                       summary: list[dict[str, Any]]) -> EventDict:
+        summary_dict = {"event": SUPPRESSED_EVENTS_EVENT, "summary": summary}
+        if "logger_name" in event_dict:
+            summary_dict["logger_name"] = event_dict["logger_name"]
+        return summary_dict
+
+
+DEFAULT_RATE_LIMITER = EventRateLimiter()
+
+
+OverflowPolicy = Literal["drop", "block"]
+
+
+class BackgroundStreamHandler(stdlib_logging.Handler):
+    # formats & writes records on a background thread, so logging never
+    # blocks the event loop on a slow stream. records wait in a bounded
+    # buffer; when it's full they're either dropped (and counted) or the
+    # logging thread blocks until the writer catches up.
+
+    def __init__(self, stream: TextIO | None = None,
+                 max_queue_size: int = 10_000,
+                 overflow_policy: OverflowPolicy = "drop",
+                 batch_size: int = 256) -> None:
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+
+        self.dropped_lines = 0
+
+        self._queue: deque[stdlib_logging.LogRecord] = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._writing = False
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._write_loop,
+                                        name="log-writer", daemon=True)
+        self._writer.start()
+
+    def _prepare(self, record: stdlib_logging.LogRecord) -> None:
+        # capture everything that depends on the logging thread's state
+        record.request_id = _REQUEST_ID_CONTEXT.get(None)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+
+    def emit(self, record: stdlib_logging.LogRecord) -> None:
+        self._prepare(record)
+
+        with self._cond:
+            while len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == "drop" or self._closed:
+                    self.dropped_lines += 1
+                    return
+
+                self._cond.wait()
+
+            self._queue.append(record)
+            if len(self._queue) == 1:
+                self._cond.notify_all()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+
+                if not self._queue:
+                    return  # closed & drained
+
+                count = min(len(self._queue), self.batch_size)
+                records = [self._queue.popleft() for _ in range(count)]
+                self._writing = True
+                self._cond.notify_all()  # wake blocked producers
+
+            lines = []
+            for record in records:
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+
+            try:
+                if lines:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def flush(self) -> None:
+        with self._cond:
+            while (self._queue or self._writing) and self._writer.is_alive():
+                self._cond.wait(timeout=0.1)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+        self._writer.join()
+        super().close()
+
+
+_LOG_HANDLER: stdlib_logging.Handler | None = None
+
+
+def get_dropped_log_lines() -> int:
+    if isinstance(_LOG_HANDLER, BackgroundStreamHandler):
+        return _LOG_HANDLER.dropped_lines
+    return 0
+
+
+def configure_logging(app_env: str, log_level: str | int,
+                      log_queue_size: int | None = 10_000,
+                      overflow_policy: OverflowPolicy = "drop",
+                      rate_limiter: EventRateLimiter | None = DEFAULT_RATE_LIMITER,
+                      ) -> None:
+    renderer_chain: list[Processor]
     if log_as_text(app_env):
-        renderer = structlog.dev.ConsoleRenderer(colors=True)
+        renderer_chain = [structlog.dev.ConsoleRenderer(colors=True)]
     else:
-        renderer = structlog.processors.JSONRenderer()
+        renderer_chain = [render_json]
 
+    # the same chain formats both structlog & stdlib records,
+    # on the handler's (possibly background) thread
     formatter = structlog.stdlib.ProcessorFormatter(
-        processor=renderer,
-        foreign_pre_chain=[
-            structlog.processors.TimeStamper(fmt="iso", key="timestamp"),
+        processors=[
+            add_timestamp,
             structlog.stdlib.add_log_level,
             structlog.stdlib.add_logger_name,
             add_process_id,
             add_request_id,
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            *renderer_chain,
+        ],
+    )
+
+    # keep the work done on the logging thread to a minimum; filtered
+    # levels return before any processor runs
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            # rate_limiter=None disables rate limiting & sampling
+            *([rate_limiter] if rate_limiter is not None else []),
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            capture_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
+        wrapper_class=structlog.stdlib.BoundLogger,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        cache_logger_on_first_use=True,
     )
 
-    handler = stdlib_logging.StreamHandler()
+    # log_queue_size=None writes synchronously from the logging thread
+    handler: stdlib_logging.Handler
+    if log_queue_size is not None:
+        handler = BackgroundStreamHandler(max_queue_size=log_queue_size,
+                                          overflow_policy=overflow_policy)
+    else:
+        handler = stdlib_logging.StreamHandler()
     handler.setFormatter(formatter)
     handler.setLevel(log_level)
 
+    global _LOG_HANDLER
+    _LOG_HANDLER = handler
+
     _ROOT_LOGGER.addHandler(handler)
+    _ROOT_LOGGER.setLevel(log_level)
 
     for name in stdlib_logging.root.manager.loggerDict:
         logger = stdlib_logging.getLogger(name)
@@ -76,23 +381,28 @@ def configure_logging(app_env: str, log_level: str | int) -> None:
 
 
 def debug(*args, **kwargs) -> None:
-    return get_logger().debug(*args, **kwargs)
+    if _ROOT_LOGGER.isEnabledFor(stdlib_logging.DEBUG):
+        get_logger().debug(*args, **kwargs)
 
 
 def info(*args, **kwargs) -> None:
-    return get_logger().info(*args, **kwargs)
+    if _ROOT_LOGGER.isEnabledFor(stdlib_logging.INFO):
+        get_logger().info(*args, **kwargs)
 
 
 def warning(*args, **kwargs) -> None:
-    return get_logger().warning(*args, **kwargs)
+    if _ROOT_LOGGER.isEnabledFor(stdlib_logging.WARNING):
+        get_logger().warning(*args, **kwargs)
 
 
 def error(*args, **kwargs) -> None:
-    return get_logger().error(*args, **kwargs)
+    if _ROOT_LOGGER.isEnabledFor(stdlib_logging.ERROR):
+        get_logger().error(*args, **kwargs)
 
 
 def critical(*args, **kwargs) -> None:
-    return get_logger().critical(*args, **kwargs)
+    if _ROOT_LOGGER.isEnabledFor(stdlib_logging.CRITICAL):
+        get_logger().critical(*args, **kwargs)
 
 
 # control the exception traceback message format
@@ -104,9 +414,7 @@ def overwrite_exception_hook() -> None:
         exc_traceback: TracebackType,
     ) -> None:
         get_logger().error("Uncaught exception",
-                           exc_type=exc_type,
-                           exc_value=exc_value,
-                           exc_traceback=exc_traceback)
+                           exc_info=(exc_type, exc_value, exc_traceback))
 
     global _default_excepthook
     _default_excepthook = sys.excepthook
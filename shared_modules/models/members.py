@@ -12,3 +12,10 @@ class Member(BaseModel):
     privileges: int
 
     joined_at: datetime
+
+
+class MembershipResult(BaseModel):
+    # one chat's outcome in a bulk join
+    chat_id: int
+    status_code: int
+    member: Member | None
@@ -1,4 +1,5 @@
 from datetime import datetime
+from uuid import UUID
 
 from . import BaseModel
 
@@ -6,3 +7,10 @@ from . import BaseModel
 class QueuedPacket(BaseModel):
     data: list[int]
     created_at: datetime
+
+
+class PacketPoll(BaseModel):
+    # packets dequeued by a long poll, by session
+    packets: dict[UUID, list[QueuedPacket]]
+    # sessions that no longer exist
+    expired: list[UUID]
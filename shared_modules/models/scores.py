@@ -31,3 +31,11 @@ class Score(BaseModel):
     status: Status
     created_at: datetime
     updated_at: datetime
+
+
+class Leaderboard(BaseModel):
+    scores: list[Score]  # each account's best score, best first
+
+    # only present when queried around a specific account
+    personal_best: Score | None
+    personal_best_rank: int | None
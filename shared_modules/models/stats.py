@@ -25,3 +25,10 @@ class Stats(BaseModel):
     status: Status
     created_at: datetime
     updated_at: datetime
+
+
+class StatsPage(BaseModel):
+    stats: list[Stats]  # best first
+
+    # pass back to fetch the following page; None on the last page
+    next_cursor: str | None
@@ -0,0 +1,212 @@
+import asyncio
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import FrameType
+
+from shared_modules import logger
+from shared_modules.logger import _REQUEST_ID_CONTEXT
+
+
+def _task_request_id(task: asyncio.Task | None) -> str | None:
+    # a task's context is only reachable from other threads on 3.12+
+    if task is None or not hasattr(task, "get_context"):
+        return None
+    return task.get_context().get(_REQUEST_ID_CONTEXT, None)
+
+
+def _describe_task(task: asyncio.Task | None) -> tuple[str | None, str | None]:
+    if task is None:
+        return None, None
+
+    coro = task.get_coro()
+    coro_name = getattr(coro, "__qualname__", None) or repr(coro)
+    return task.get_name(), coro_name
+
+
+class EventLoopMonitor:
+    # measures event loop lag from a ticking task, and detects blocking
+    # callbacks from a watchdog thread which, while the loop is stuck,
+    # captures the running task & the loop thread's stack.
+
+    def __init__(self, interval: float = 0.1,
+                 lag_threshold: float = 0.1,
+                 block_threshold: float = 0.5) -> None:
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.block_threshold = block_threshold
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_count = 0
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat = time.monotonic()
+
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        # must be called from within the loop being monitored
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+
+        self._task = self._loop.create_task(self._measure_lag(),
+                                            name="event-loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch,
+                                          name="event-loop-watchdog",
+                                          daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _measure_lag(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            self._heartbeat = now
+            self.lag = max(0.0, now - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+            if self.lag >= self.lag_threshold:
+                logger.warning("Event loop lag",
+                               lag_ms=round(self.lag * 1000, 3))
+
+    def _watch(self) -> None:
+        reported_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat
+            if blocked_for < self.block_threshold:
+                continue
+
+            if heartbeat == reported_heartbeat:
+                continue  # already reported this block
+
+            reported_heartbeat = heartbeat
+            self.blocked_count += 1
+            self._report_block(blocked_for)
+
+    def _report_block(self, blocked_for: float) -> None:
+        assert self._loop is not None and self._loop_thread_id is not None
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else None
+
+        task = asyncio.current_task(self._loop)
+        task_name, coro_name = _describe_task(task)
+
+        # this runs on the watchdog thread, so the request id has to
+        # be taken from the blocking task rather than our own context
+        extra = {}
+        if request_id := _task_request_id(task):
+            extra["request_id"] = request_id
+
+        logger.warning("Event loop blocked",
+                       blocked_ms=round(blocked_for * 1000, 3),
+                       task=task_name,
+                       coroutine=coro_name,
+                       stack=stack,
+                       **extra)
+
+
+def _collapse_stack(frame: FrameType | None) -> str:
+    # root-first "file:function;file:function" (flamegraph input format)
+    entries = []
+    while frame is not None:
+        code = frame.f_code
+        entries.append(f"{code.co_filename}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(entries))
+
+
+class SamplingProfiler:
+    # periodically samples one thread's stack (the event loop's by default)
+    # into collapsed-stack counts. cheap enough to toggle on in production.
+
+    def __init__(self, interval: float = 0.005,
+                 thread_id: int | None = None) -> None:
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+
+        self.samples: Counter[str] = Counter()
+
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample,
+                                        name="sampling-profiler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def toggle(self) -> None:
+        if self.running:
+            self.stop()
+            self.log_top()
+            self.samples.clear()
+        else:
+            self.start()
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[_collapse_stack(frame)] += 1
+
+    def top(self, n: int = 20) -> list[tuple[str, int]]:
+        return self.samples.most_common(n)
+
+    def log_top(self, n: int = 20) -> None:
+        total = sum(self.samples.values())
+        logger.info("Sampling profiler results",
+                    total_samples=total,
+                    interval_ms=self.interval * 1000,
+                    top_stacks=[{"stack": stack, "samples": count}
+                                for stack, count in self.top(n)])
+
+
+def install_profiler_toggle(profiler: SamplingProfiler,
+                            signum: int = signal.SIGUSR2) -> None:
+    # e.g. `kill -USR2 <pid>` starts sampling; sending it again stops
+    # sampling and logs the hottest stacks
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signum, profiler.toggle)
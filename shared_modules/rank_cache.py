@@ -0,0 +1,138 @@
+import bisect
+from typing import Iterable
+from typing import Literal
+
+from shared_modules.models import Status
+from shared_modules.models.stats import Stats
+
+RankingSort = Literal["performance", "ranked_score"]
+RANKING_SORTS: tuple[RankingSort, ...] = ("performance", "ranked_score")
+
+# (-value, account_id); ascending order is best first, ties by account id
+RankingEntry = tuple[int, int]
+
+
+def ranking_entry(stats: Stats, sort: RankingSort) -> RankingEntry:
+    return (-getattr(stats, sort), stats.account_id)
+
+
+def is_ranked(stats: Stats) -> bool:
+    return stats.status == Status.ACTIVE
+
+
+def encode_cursor(value: int, account_id: int) -> str:
+    # cursors point just past the last entry of a page
+    return f"{value}:{account_id}"
+
+
+def decode_cursor(cursor: str) -> RankingEntry:
+    value, account_id = cursor.split(":")
+    return (-int(value), int(account_id))
+
+
+class _Ranking:
+    def __init__(self, sort: RankingSort) -> None:
+        self.sort = sort
+        self.entries: list[RankingEntry] = []
+        self.positions: dict[int, RankingEntry] = {}
+
+    def load(self, stats: Iterable[Stats]) -> None:
+        self.positions = {s.account_id: ranking_entry(s, self.sort)
+                          for s in stats if is_ranked(s)}
+        self.entries = sorted(self.positions.values())
+
+    def discard(self, account_id: int) -> None:
+        entry = self.positions.pop(account_id, None)
+        if entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def update(self, stats: Stats) -> None:
+        if not is_ranked(stats):
+            self.discard(stats.account_id)
+            return
+
+        entry = ranking_entry(stats, self.sort)
+        if self.positions.get(stats.account_id) == entry:
+            return
+
+        self.discard(stats.account_id)
+        self.positions[stats.account_id] = entry
+        bisect.insort(self.entries, entry)
+
+    def rank(self, account_id: int) -> int | None:
+        entry = self.positions.get(account_id)
+        if entry is None:
+            return None
+
+        # 1 + the number of accounts strictly ahead; ties share a rank
+        return bisect.bisect_left(self.entries, (entry[0],)) + 1
+
+
+class RankCache:
+    # a local copy of each mode's global rankings, kept sorted as stats
+    # change so a rank lookup is a binary search rather than a re-sort.
+    # a mode is only ranked once it's been loaded in full; until then
+    # lookups miss and updates for it are ignored.
+
+    def __init__(self) -> None:
+        self._rankings: dict[tuple[int, RankingSort], _Ranking] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def is_loaded(self, game_mode: int) -> bool:
+        return (game_mode, RANKING_SORTS[0]) in self._rankings
+
+    def load(self, game_mode: int, stats: Iterable[Stats]) -> None:
+        # `stats` must be every account's stats in the mode
+        stats = list(stats)
+        for sort in RANKING_SORTS:
+            ranking = _Ranking(sort)
+            ranking.load(stats)
+            self._rankings[(game_mode, sort)] = ranking
+
+    def update(self, stats: Stats) -> None:
+        for sort in RANKING_SORTS:
+            ranking = self._rankings.get((stats.game_mode, sort))
+            if ranking is not None:
+                ranking.update(stats)
+
+    def discard(self, account_id: int, game_mode: int) -> None:
+        for sort in RANKING_SORTS:
+            ranking = self._rankings.get((game_mode, sort))
+            if ranking is not None:
+                ranking.discard(account_id)
+
+    def rank(self, account_id: int, game_mode: int,
+             sort: RankingSort = "performance") -> int | None:
+        ranking = self._rankings.get((game_mode, sort))
+        if ranking is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return ranking.rank(account_id)
+
+    def page(self, game_mode: int, sort: RankingSort = "performance",
+             limit: int = 50, cursor: str | None = None,
+             ) -> tuple[list[int], str | None] | None:
+        # account ids in rank order & the cursor for the next page
+        ranking = self._rankings.get((game_mode, sort))
+        if ranking is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        start = (bisect.bisect_right(ranking.entries, decode_cursor(cursor))
+                 if cursor is not None else 0)
+        entries = ranking.entries[start:start + limit]
+
+        next_cursor = None
+        if entries and start + limit < len(ranking.entries):
+            value, account_id = entries[-1]
+            next_cursor = encode_cursor(-value, account_id)
+
+        return [account_id for _, account_id in entries], next_cursor
+
+    def clear(self) -> None:
+        self._rankings.clear()
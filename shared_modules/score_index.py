@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Iterable
+
+from shared_modules.models import Status
+from shared_modules.models.scores import Score
+
+# (account_id, beatmap_md5, mode)
+IndexKey = tuple[int, str, str]
+
+
+def is_personal_best_candidate(score: Score) -> bool:
+    return score.passed and score.status == Status.ACTIVE
+
+
+def personal_best_key(score: Score) -> tuple[int, int]:
+    # higher score first; on ties, the earlier submission (lower id) wins
+    return (score.score, -score.score_id)
+
+
+class ScoreIndex:
+    # an LRU-bounded index of each account's best score per map & mode.
+    # an entry only exists once the full set of the account's scores on the
+    # map is known, so a hit (including a known "no score") is authoritative.
+
+    def __init__(self, max_size: int = 100_000) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[IndexKey, Score | None] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: IndexKey, score: Score | None) -> None:
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def lookup(self, account_id: int, beatmap_md5: str, mode: str,
+               ) -> tuple[bool, Score | None]:
+        key = (account_id, beatmap_md5, mode)
+        try:
+            score = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, score
+
+    def set_best(self, account_id: int, beatmap_md5: str, mode: str,
+                 score: Score | None) -> None:
+        self._store((account_id, beatmap_md5, mode), score)
+
+    def record_all(self, account_id: int, beatmap_md5: str, mode: str,
+                   scores: Iterable[Score]) -> None:
+        # `scores` must be every score the account has on the map & mode
+        candidates = [s for s in scores if is_personal_best_candidate(s)]
+        best = max(candidates, key=personal_best_key, default=None)
+        self.set_best(account_id, beatmap_md5, mode, best)
+
+    def record(self, score: Score) -> None:
+        key = (score.account_id, score.beatmap_md5, score.mode)
+        if key not in self._entries or not is_personal_best_candidate(score):
+            # without the full history we can't tell if it's a best
+            return
+
+        current = self._entries[key]
+        if current is None or personal_best_key(score) > personal_best_key(current):
+            self._store(key, score)
+
+    def discard(self, score: Score) -> None:
+        key = (score.account_id, score.beatmap_md5, score.mode)
+        current = self._entries.get(key)
+        if current is not None and current.score_id == score.score_id:
+            # the runner-up is unknown; fall back to the service next time
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,283 @@
+import fcntl
+import hashlib
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+_MAGIC = b"SMSC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHII")  # magic, version, slots, slot size
+_HEADER_SIZE = 64
+# seq, key hash, key length, value length, expires at (0 = never)
+_SLOT_HEADER = struct.Struct("<IQHId")
+_SEQ = struct.Struct("<I")
+
+# how many neighbouring slots a key may live in
+PROBE_LENGTH = 8
+
+# attempts to get a consistent read of a slot that's being written
+READ_RETRIES = 16
+
+# attempts to take the lock before giving up; it's only ever held for a
+# slot's write, & waiting on it would block the event loop
+LOCK_RETRIES = 100
+
+# x86 keeps plain stores in program order, which the lock-free reads
+# rely on; elsewhere, reads take the lock too
+LOCK_FREE_READS = platform.machine().lower() in ("x86_64", "amd64", "i386",
+                                                 "i686", "x86")
+
+
+def _hash_key(key: bytes) -> int:
+    # stable across processes, unlike hash(); 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                          "little") or 1
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # only the creator should track (& so unlink) the segment; otherwise
+    # the first attached worker to exit would take it with it
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+def _lock_path(name: str) -> str:
+    directory = "/dev/shm"
+    if not os.path.isdir(directory):
+        directory = tempfile.gettempdir()
+    return os.path.join(directory, f"{name}.lock")
+
+
+class SharedMemoryCache:
+    # a fixed-size hash table of bytes values in shared memory, for the
+    # worker processes of one host. reads take no locks: each slot is a
+    # seqlock, whose sequence number is odd while a write is in progress,
+    # and readers retry until they see the same even number either side
+    # of their copy. writers are serialized with an flock.
+    #
+    # the ordering this relies on (sequence, then body, then sequence) is
+    # what x86 guarantees for plain stores; other architectures would
+    # need barriers python doesn't expose, so there reads are serialized
+    # with writes through the flock instead (see LOCK_FREE_READS).
+    #
+    # the flock is never waited on: a write that can't get it raises
+    # BlockingIOError, and a locked read is a miss.
+
+    def __init__(self, name: str, slots: int = 4096, slot_size: int = 1024,
+                 create: bool = False) -> None:
+        if create:
+            size = _HEADER_SIZE + slots * slot_size
+            self._shm = shared_memory.SharedMemory(name, create=True,
+                                                   size=size)
+            self._shm.buf[:size] = bytes(size)
+            _HEADER.pack_into(self._shm.buf, 0, _MAGIC, _VERSION, slots,
+                              slot_size)
+        else:
+            self._shm = _attach(name)
+
+            magic, version, slots, slot_size = \
+                _HEADER.unpack_from(self._shm.buf, 0)
+            if magic != _MAGIC or version != _VERSION:
+                self._shm.close()
+                raise ValueError(f"{name} is not a v{_VERSION} shared "
+                                 "memory cache")
+
+        self.name = name
+        self.slots = slots
+        self.slot_size = slot_size
+        self.capacity = slot_size - _SLOT_HEADER.size  # key + value bytes
+
+        self._buf = self._shm.buf
+        self._lock_fd = os.open(_lock_path(name), os.O_RDWR | os.O_CREAT,
+                                0o644)
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def create(cls, name: str, slots: int = 4096,
+               slot_size: int = 1024) -> "SharedMemoryCache":
+        return cls(name, slots, slot_size, create=True)
+
+    def close(self) -> None:
+        self._buf = None  # type: ignore[assignment]
+        self._shm.close()
+        os.close(self._lock_fd)
+
+    def unlink(self) -> None:
+        # by the creator, once every worker is done with it
+        self._shm.unlink()
+        try:
+            os.unlink(_lock_path(self.name))
+        except FileNotFoundError:
+            pass
+
+    def _offsets(self, key_hash: int) -> list[int]:
+        first = key_hash % self.slots
+        return [_HEADER_SIZE + ((first + i) % self.slots) * self.slot_size
+                for i in range(min(PROBE_LENGTH, self.slots))]
+
+    # reads (lock-free)
+
+    def _read_slot(self, offset: int, key: bytes,
+                   key_hash: int) -> bytes | None:
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            seq, slot_hash, key_len, value_len, expires_at = \
+                _SLOT_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue  # mid-write
+
+            if slot_hash != key_hash:
+                return None
+
+            start = offset + _SLOT_HEADER.size
+            length = min(key_len + value_len, self.capacity)
+            data = bytes(buf[start:start + length])
+            if _SEQ.unpack_from(buf, offset)[0] != seq:
+                continue  # rewritten under us
+
+            if data[:key_len] != key:
+                return None
+            if expires_at and expires_at < time.time():
+                return None
+            return data[key_len:]
+
+        return None  # too contended; treat as a miss
+
+    def _lookup(self, key: bytes, key_hash: int) -> bytes | None:
+        for offset in self._offsets(key_hash):
+            value = self._read_slot(offset, key, key_hash)
+            if value is not None:
+                return value
+        return None
+
+    def get(self, key: str) -> bytes | None:
+        key_bytes = key.encode()
+        key_hash = _hash_key(key_bytes)
+        if LOCK_FREE_READS:
+            value = self._lookup(key_bytes, key_hash)
+        elif self._try_lock(fcntl.LOCK_SH):
+            try:
+                value = self._lookup(key_bytes, key_hash)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        else:
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    # writes (serialized across processes)
+
+    def _try_lock(self, operation: int) -> bool:
+        for _ in range(LOCK_RETRIES):
+            try:
+                fcntl.flock(self._lock_fd, operation | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                os.sched_yield()
+        return False
+
+    def _lock(self) -> None:
+        if not self._try_lock(fcntl.LOCK_EX):
+            raise BlockingIOError(f"{self.name} is locked by another process")
+
+    def _write_slot(self, offset: int, key_hash: int, key: bytes,
+                    value: bytes, expires_at: float) -> None:
+        buf = self._buf
+        seq = _SEQ.unpack_from(buf, offset)[0]
+        writing = (seq + 1) & 0xFFFFFFFF  # odd; wraps to stay a u32
+        _SEQ.pack_into(buf, offset, writing)
+
+        _SLOT_HEADER.pack_into(buf, offset, writing, key_hash, len(key),
+                               len(value), expires_at)
+        start = offset + _SLOT_HEADER.size
+        buf[start:start + len(key) + len(value)] = key + value
+
+        _SEQ.pack_into(buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _find_slot(self, key: bytes, key_hash: int) -> int:
+        # the key's current slot, else an empty or expired one, else the
+        # one closest to expiring
+        now = time.time()
+        free = None
+        victim, victim_expires_at = -1, float("inf")
+        for offset in self._offsets(key_hash):
+            _, slot_hash, key_len, _, expires_at = \
+                _SLOT_HEADER.unpack_from(self._buf, offset)
+            start = offset + _SLOT_HEADER.size
+            if (slot_hash == key_hash and
+                    self._buf[start:start + key_len] == key):
+                return offset
+
+            if free is None and (slot_hash == 0 or
+                                 (expires_at and expires_at < now)):
+                free = offset
+
+            expiry = expires_at or float("inf")
+            if victim == -1 or expiry < victim_expires_at:
+                victim, victim_expires_at = offset, expiry
+
+        return free if free is not None else victim
+
+    def _store(self, key: str, value: bytes, ttl: float | None,
+               only_if_absent: bool) -> bool:
+        key_bytes = key.encode()
+        if len(key_bytes) + len(value) > self.capacity:
+            return False  # doesn't fit a slot
+
+        key_hash = _hash_key(key_bytes)
+        expires_at = time.time() + ttl if ttl is not None else 0.0
+
+        self._lock()
+        try:
+            if (only_if_absent and
+                    self._lookup(key_bytes, key_hash) is not None):
+                return False
+
+            offset = self._find_slot(key_bytes, key_hash)
+            self._write_slot(offset, key_hash, key_bytes, value, expires_at)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        return True
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return self._store(key, value, ttl, only_if_absent=False)
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # set only if absent (or expired); True if it was set
+        return self._store(key, value, ttl, only_if_absent=True)
+
+    def delete(self, key: str) -> None:
+        key_bytes = key.encode()
+        key_hash = _hash_key(key_bytes)
+
+        self._lock()
+        try:
+            for offset in self._offsets(key_hash):
+                _, slot_hash, key_len, _, _ = \
+                    _SLOT_HEADER.unpack_from(self._buf, offset)
+                start = offset + _SLOT_HEADER.size
+                if (slot_hash == key_hash and
+                        self._buf[start:start + key_len] == key_bytes):
+                    self._write_slot(offset, 0, b"", b"", 0.0)
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)